@@ -101,12 +101,11 @@ class Membership:
                 np.zeros((len(bgc_ids), len(hmm_ids)), dtype=np.uint8),
                 index=bgc_ids, columns=hmm_ids)
             # fill bgc_features
-            for bgc_id, hmm_id, value in bgc_database.select(
+            for bgc_id, hmm_id, value in bgc_database.select_iter(
                 "bgc_features",
                 "WHERE 1",
                 props=["bgc_features.bgc_id",
-                       "bgc_features.hmm_id", "bgc_features.value"],
-                as_tuples=True
+                       "bgc_features.hmm_id", "bgc_features.value"]
             ):
                 bgc_features.at[bgc_id, hmm_id] = value
 
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.antismash_json
+
+Reader for the per-genome antiSMASH (5 and up) JSON results, yields
+the regions as gbk.GBKRecord objects, i.e. what would be read from
+the corresponding regiongbks by the fast gbk reader
+"""
+
+import json
+import re
+from typing import Iterator, TextIO, Tuple, Union
+from .gbk import GBKFeature, GBKLocation, GBKRecord
+
+
+# str() of Bio.SeqFeature (Simple/Compound)Location,
+# e.g. "[0:100](+)" or "join{[0:10](+), [20:30](+)}"
+_LOCATION_PARTS = re.compile(
+    r"\[[<>]?(\d+):[<>]?(\d+)\](?:\(([+\-?])\))?")
+_STRANDS = {"+": 1, "-": -1, "?": 0, None: None}
+
+
+def location_from_string(location: str):
+    """parse a (serialized) Bio.SeqFeature location, with the
+    same semantics as gbk.GBKLocation"""
+    starts = []
+    ends = []
+    strands = set()
+    for match in _LOCATION_PARTS.finditer(location):
+        starts.append(int(match.group(1)))
+        ends.append(int(match.group(2)))
+        strands.add(_STRANDS[match.group(3)])
+    if not starts:
+        return None
+    return GBKLocation(min(starts), max(ends),
+                       strands.pop() if len(strands) == 1 else None)
+
+
+def parse(json_path: Union[str, TextIO],
+          feature_types: set=None) -> Iterator[Tuple[str, GBKRecord]]:
+    """iterate over the regions of an antiSMASH JSON (path or
+    opened text handle), yields (regiongbk file name, record),
+    if feature_types is given, features of any other type are
+    skipped entirely"""
+    if isinstance(json_path, str):
+        with open(json_path, "r") as handle:
+            data = json.load(handle)
+    else:
+        data = json.load(json_path)
+    if not isinstance(data, dict):  # not an antiSMASH result
+        return
+
+    annotations = {
+        "structured_comment": {
+            "antiSMASH-Data": {
+                "Version": data.get("version", "")
+            }
+        }
+    }
+    for record in data.get("records", []):
+        features = []
+        regions = []
+        for feature in record.get("features", []):
+            if feature_types is not None and \
+                    feature["type"] not in feature_types:
+                continue
+            location = location_from_string(feature["location"])
+            if location is None:
+                continue
+            features.append(GBKFeature(
+                feature["type"], location, feature["qualifiers"]))
+            if feature["type"] == "region":
+                regions.append(features[-1])
+        whole_record = GBKRecord(record["id"], annotations, features)
+        for region in regions:
+            region_number = int(region.qualifiers["region_number"][0])
+            yield (
+                "{}.region{:03d}.gbk".format(record["id"], region_number),
+                whole_record[region.location.start:region.location.end]
+            )
@@ -10,14 +10,22 @@ Handle manipulation and storing of 'bgc' table
 """
 
 from os import path
+from hashlib import md5
+import numpy as np
 from Bio import SeqIO, SeqFeature
-from typing import List
+from typing import Dict, List, Set, TextIO, Tuple, Union
 from .database import Database
+from .encoding import compress_aa_seq, decompress_aa_seq, decode_gaps
+from . import gbk as gbk_reader
+from . import antismash_json
 
 
 class BGC:
     """Represents a BGC in the database"""
 
+    __slots__ = ("id", "name", "type", "on_contig_edge", "length_nt",
+                 "orig_folder", "orig_filename", "chem_subclasses", "cds")
+
     def __init__(self, properties: dict):
         self.id = properties.get("id", -1)
         self.name = properties["name"]
@@ -29,27 +37,18 @@ class BGC:
         self.chem_subclasses = properties["chem_subclasses"]
         self.cds = properties["cds"]
 
-    def save(self, dataset_id: int, database: Database):
-        """commits bgc data"""
-
-        existing = database.select(
-            "bgc",
-            "WHERE name=? AND dataset_id=?",
-            parameters=(self.name, dataset_id)
-        )
-        if existing:
-            # for now, this should not get called
+    def save(self, dataset_id: int, database: Database,
+             protein_ids: Dict[str, int]=None,
+             chem_resolver: "BGC.ChemSubclassResolver"=None):
+        """commits bgc data
+        (whether the gbk file needs to be (re-)inserted is decided
+        beforehand, see the dataset's gbk_file manifest)
+        protein_ids: see BGC.Protein.get_id()
+        chem_resolver: preloaded BGC.ChemSubclassResolver, to be
+        reused across save() calls (otherwise query the database)"""
+
+        if self.id > -1:
             raise Exception("not_implemented")
-            # current behavior: check if there is conflict
-            # don't do anything if the same bgc exists
-            assert len(existing) == 1
-            existing = existing[0]
-            if self.length_nt != existing["length_nt"]:
-                raise Exception("conflicting BGC entry for " +
-                                self.name)
-            else:
-                self.id = existing["id"]
-                # TODO: load exisiting data into the object
         else:
             # insert new BGC
             self.id = database.insert(
@@ -64,219 +63,344 @@ class BGC:
                     "orig_filename": self.orig_filename
                 }
             )
-            # insert classes
-            for cc in self.chem_subclasses:
-                chem_subclass_object = BGC.ChemSubclass.search(
-                    database, cc, self.type)
-                chem_subclass_object.bgc_id = self.id
-                chem_subclass_object.__save__(database)
-            # insert cds
+            # insert classes & cds
+            # (no need to check for existing rows, the BGC is new)
+            BGC.ChemSubclass.save_all(
+                self.id, self.type, self.chem_subclasses, database,
+                chem_resolver)
             for cds in self.cds:
                 cds.bgc_id = self.id
-                cds.__save__(database)
+                cds.__save__(database, protein_ids, check_existing=False)
+
+    # feature types read by parse_gbk()
+    GBK_FEATURE_TYPES = {"protocluster", "subregion", "region",
+                         "cluster", "CDS"}
 
     @staticmethod
-    def parse_gbk(gbk_path: str, orig_gbk_path: str=None):
+    def parse_gbk(gbk_path: Union[str, TextIO], orig_gbk_path: str=None,
+                  backend: str="biopython"):
         """Load BGCs from a gbk file, return a list of BGC
         objects (one gbk file can contain multiple BGCs e.g.
-        in the case of antiSMASH5 GBKs"""
+        in the case of antiSMASH5 GBKs
+        gbk_path: path or opened text handle (then orig_gbk_path
+        is required)
+        backend: "biopython" (Bio.SeqIO) or "fast" (see
+        modules/data/gbk.py, skips everything not used here)"""
 
         if not orig_gbk_path:
             orig_gbk_path = gbk_path
 
         results = []
 
-        gbk_type = None
-        records = SeqIO.parse(gbk_path, "gb")
+        if backend == "biopython":
+            records = SeqIO.parse(gbk_path, "gb")
+        elif backend == "fast":
+            records = gbk_reader.parse(
+                gbk_path, feature_types=BGC.GBK_FEATURE_TYPES)
+        else:
+            raise Exception("unknown gbk parser backend: " + backend)
         for gbk in records:
+            # only the first record is used
+            results.extend(BGC.from_gbk_record(gbk, orig_gbk_path))
+            break
 
-            # fetch type-specific information
-            antismash_dict = gbk.annotations.get(
-                "structured_comment", {}).get(
-                "antiSMASH-Data", {})
-            antismash_version = antismash_dict.get("Version", "")
-            if antismash_version.split(".")[0] in ["5", "6", "7", "8"]:
-                for feature in gbk.features:
-                    if feature.type == "protocluster":
-                        # is antiSMASH5/6/7/8 clustergbk
-                        gbk_type = "as" + antismash_version.split(".")[0]
+        return results
+
+    @staticmethod
+    def parse_antismash_json(json_path: Union[str, TextIO],
+                             orig_folder: str):
+        """Load BGCs from an antiSMASH (5 and up) JSON result, return
+        a list of BGC objects, the same as those parsed from the
+        regiongbks of the run in orig_folder
+        json_path: path or opened text handle"""
+
+        results = []
+        for gbk_name, gbk in antismash_json.parse(
+                json_path, feature_types=BGC.GBK_FEATURE_TYPES):
+            results.extend(BGC.from_gbk_record(
+                gbk, path.join(orig_folder, gbk_name)))
+        return results
+
+    @staticmethod
+    def from_gbk_record(gbk, orig_gbk_path: str):
+        """Load BGCs from a parsed gbk record (a Bio.SeqRecord
+        or a gbk.GBKRecord), see parse_gbk()"""
+
+        results = []
+        gbk_type = None
+
+        # fetch type-specific information
+        antismash_dict = gbk.annotations.get(
+            "structured_comment", {}).get(
+            "antiSMASH-Data", {})
+        antismash_version = antismash_dict.get("Version", "")
+        if antismash_version.split(".")[0] in ["5", "6", "7", "8"]:
+            for feature in gbk.features:
+                if feature.type == "protocluster":
+                    # is antiSMASH5/6/7/8 clustergbk
+                    gbk_type = "as" + antismash_version.split(".")[0]
+                    break
+                elif feature.type == "subregion":
+                    if "aStool" in feature.qualifiers and \
+                            feature.qualifiers["aStool"][0] == "mibig":
+                        gbk_type = "mibig"
                         break
-                    elif feature.type == "subregion":
-                        if "aStool" in feature.qualifiers and \
-                                feature.qualifiers["aStool"][0] == "mibig":
-                            gbk_type = "mibig"
-                            break
-                if not gbk_type:
-                    print(orig_gbk_path +
-                          " is not a recognized antiSMASH clustergbk")
-                    # not recognized, skip for now
-                    pass
-
-                elif gbk_type == "mibig":
-                    for feature in gbk.features:
-                        qual = feature.qualifiers
-                        if feature.type == "subregion" and \
-                            "aStool" in qual and \
-                                qual["aStool"][0] == "mibig":
-                            subreg = feature
-                            name = gbk.id
-                            on_edge = True
-                            loc = subreg.location
-                            len_nt = loc.end - loc.start
-                            chem_subclasses = [label.strip() for label in
-                                               qual["label"][0].split(",")]
-                            cds_features = [f for f in
-                                            gbk[loc.start:loc.end].features if
-                                            f.type == "CDS"]
-                            results.append(BGC({
-                                "name": name,
-                                "type": gbk_type,
-                                "on_contig_edge": on_edge,
-                                "length_nt": len_nt,
-                                "orig_folder": path.dirname(orig_gbk_path),
-                                "orig_filename": path.basename(orig_gbk_path),
-                                "chem_subclasses": chem_subclasses,
-                                "cds": [BGC.CDS.from_feature(f)
-                                        for f in cds_features]
-                            }))
-                            break
-
-                elif gbk_type in ["as5", "as6", "as7", "as8"]:
-                    # get all regions
-                    for feature in gbk.features:
-                        qual = feature.qualifiers
-                        if feature.type == "region":
-                            reg = feature
-                            name = path.splitext(orig_gbk_path)[0]
-                            on_edge = qual["contig_edge"][0] == "True"
-                            loc = reg.location
-                            len_nt = loc.end - loc.start
-                            chem_subclasses = qual["product"]
-                            cds_features = [f for f in
-                                            gbk[loc.start:loc.end].features if
-                                            f.type == "CDS"]
-                            results.append(BGC({
-                                "name": name,
-                                "type": gbk_type,
-                                "on_contig_edge": on_edge,
-                                "length_nt": len_nt,
-                                "orig_folder": path.dirname(orig_gbk_path),
-                                "orig_filename": path.basename(orig_gbk_path),
-                                "chem_subclasses": chem_subclasses,
-                                "cds": [BGC.CDS.from_feature(f)
-                                        for f in cds_features]
-                            }))
-
-            else:  # assume antiSMASH 4
-                cluster = None
+            if not gbk_type:
+                print(orig_gbk_path +
+                      " is not a recognized antiSMASH clustergbk")
+                # not recognized, skip for now
+                pass
+
+            elif gbk_type == "mibig":
                 for feature in gbk.features:
-                    if feature.type == "cluster":
-                        if cluster:  # contain 2 or more clusters
-                            cluster = None
-                            break
-                        else:
-                            cluster = feature
-                if not cluster:
-                    print(orig_gbk_path +
-                          " is not a recognized antiSMASH clustergbk")
-                    break
-                qual = cluster.qualifiers
-                for note in qual["note"]:
-                    if note.startswith("Detection rule(s) for this " +
-                                       "cluster type: plants/"):
-                        gbk_type = "plant"
+                    qual = feature.qualifiers
+                    if feature.type == "subregion" and \
+                        "aStool" in qual and \
+                            qual["aStool"][0] == "mibig":
+                        subreg = feature
+                        name = gbk.id
+                        on_edge = True
+                        loc = subreg.location
+                        len_nt = loc.end - loc.start
+                        chem_subclasses = [label.strip() for label in
+                                           qual["label"][0].split(",")]
+                        cds_features = [f for f in
+                                        gbk[loc.start:loc.end].features if
+                                        f.type == "CDS"]
+                        results.append(BGC({
+                            "name": name,
+                            "type": gbk_type,
+                            "on_contig_edge": on_edge,
+                            "length_nt": len_nt,
+                            "orig_folder": path.dirname(orig_gbk_path),
+                            "orig_filename": path.basename(orig_gbk_path),
+                            "chem_subclasses": chem_subclasses,
+                            "cds": [BGC.CDS.from_feature(f)
+                                    for f in cds_features]
+                        }))
                         break
-                if not gbk_type:
-                    gbk_type = "as4"
-                name = path.splitext(orig_gbk_path)[0]
-                on_edge = None
-                loc = cluster.location
-                len_nt = loc.end - loc.start
-                chem_subclasses = qual["product"]
-                cds_features = [f for f in
-                                gbk[loc.start:loc.end].features if
-                                f.type == "CDS"]
-                results.append(BGC({
-                    "name": name,
-                    "type": gbk_type,
-                    "on_contig_edge": on_edge,
-                    "length_nt": len_nt,
-                    "orig_folder": path.dirname(orig_gbk_path),
-                    "orig_filename": path.basename(orig_gbk_path),
-                    "chem_subclasses": chem_subclasses,
-                    "cds": [BGC.CDS.from_feature(f)
-                            for f in cds_features]
-                }))
 
-            break
+            elif gbk_type in ["as5", "as6", "as7", "as8"]:
+                # get all regions
+                for feature in gbk.features:
+                    qual = feature.qualifiers
+                    if feature.type == "region":
+                        reg = feature
+                        name = path.splitext(orig_gbk_path)[0]
+                        on_edge = qual["contig_edge"][0] == "True"
+                        loc = reg.location
+                        len_nt = loc.end - loc.start
+                        chem_subclasses = qual["product"]
+                        cds_features = [f for f in
+                                        gbk[loc.start:loc.end].features if
+                                        f.type == "CDS"]
+                        results.append(BGC({
+                            "name": name,
+                            "type": gbk_type,
+                            "on_contig_edge": on_edge,
+                            "length_nt": len_nt,
+                            "orig_folder": path.dirname(orig_gbk_path),
+                            "orig_filename": path.basename(orig_gbk_path),
+                            "chem_subclasses": chem_subclasses,
+                            "cds": [BGC.CDS.from_feature(f)
+                                    for f in cds_features]
+                        }))
+
+        else:  # assume antiSMASH 4
+            cluster = None
+            for feature in gbk.features:
+                if feature.type == "cluster":
+                    if cluster:  # contain 2 or more clusters
+                        cluster = None
+                        break
+                    else:
+                        cluster = feature
+            if not cluster:
+                print(orig_gbk_path +
+                      " is not a recognized antiSMASH clustergbk")
+                return results
+            qual = cluster.qualifiers
+            for note in qual["note"]:
+                if note.startswith("Detection rule(s) for this " +
+                                   "cluster type: plants/"):
+                    gbk_type = "plant"
+                    break
+            if not gbk_type:
+                gbk_type = "as4"
+            name = path.splitext(orig_gbk_path)[0]
+            on_edge = None
+            loc = cluster.location
+            len_nt = loc.end - loc.start
+            chem_subclasses = qual["product"]
+            cds_features = [f for f in
+                            gbk[loc.start:loc.end].features if
+                            f.type == "CDS"]
+            results.append(BGC({
+                "name": name,
+                "type": gbk_type,
+                "on_contig_edge": on_edge,
+                "length_nt": len_nt,
+                "orig_folder": path.dirname(orig_gbk_path),
+                "orig_filename": path.basename(orig_gbk_path),
+                "chem_subclasses": chem_subclasses,
+                "cds": [BGC.CDS.from_feature(f)
+                        for f in cds_features]
+            }))
 
         return results
 
-    def get_all_cds_fasta(bgc_ids: List[int], database: Database):
-        """query database, get all aa sequences
-        of the CDS into a multifasta string
-        e.g. for the purpose of doing hmmscan"""
+    def get_all_cds_sequences(bgc_ids: List[int], database: Database,
+                              seen_aa_seq_ids: Set[int]=None):
+        """query database, get all unique aa sequences of the CDS
+        e.g. for the purpose of doing hmmsearch, returns
+        [((bgc_id, cds_id, parent_hsp_id (0), offset (0)), aa_seq)]
+        each sequence is returned once, for the first CDS
+        (by id) having it, see get_cds_aa_seq_ids()
+        seen_aa_seq_ids: if given, skip the sequences in it,
+        and add the returned ones to it"""
 
         rows = database.select(
-            "cds",
-            "WHERE bgc_id IN (" + ",".join(map(str, bgc_ids)) + ")",
-            props=["id", "bgc_id", "aa_seq"]
+            "cds,protein",
+            "WHERE cds.aa_seq_id=protein.id" +
+            " AND bgc_id IN (" +
+            database.temp_ids("bgc_ids", bgc_ids) + ")" +
+            " ORDER BY cds.id",
+            props=["cds.id", "bgc_id", "aa_seq_id", "aa_seq"]
         )
 
-        multifasta = ""
+        if seen_aa_seq_ids is None:
+            seen_aa_seq_ids = set()
+
+        results = []
         for row in rows:
-            multifasta += ">bgc:{}|cds:{}|hsp:0|{}-{}\n".format(
-                row["bgc_id"], row["id"],
-                0, len(row["aa_seq"]))
-            multifasta += "{}\n".format(row["aa_seq"])
-        return multifasta
+            if row["aa_seq_id"] in seen_aa_seq_ids:
+                continue
+            seen_aa_seq_ids.add(row["aa_seq_id"])
+            results.append((
+                (row["bgc_id"], row["id"], 0, 0),
+                decompress_aa_seq(row["aa_seq"])))
+        return results
 
-    def get_all_aligned_hsp(bgc_ids: List[int], hmm_ids: List[int],
-                            database: Database):
-        """query database, get all aligned hsp
-        hits from the list of hmm ids"""
+    def get_cds_aa_seq_ids(bgc_ids: List[int], database: Database):
+        """query database, group the CDS ids
+        by their aa sequences (protein ids)
+        returns {aa_seq_id: [cds_id, ...]}, cds_ids sorted"""
 
-        rows = database.select(
+        results = {}
+        for cds_id, aa_seq_id in database.select(
+            "cds",
+            "WHERE bgc_id IN (" +
+            database.temp_ids("bgc_ids", bgc_ids) + ")" +
+            " ORDER BY id",
+            props=["id", "aa_seq_id"],
+            as_tuples=True
+        ):
+            if aa_seq_id not in results:
+                results[aa_seq_id] = []
+            results[aa_seq_id].append(cds_id)
+        return results
+
+    def get_residue_counts(bgc_ids: List[int], database: Database):
+        """query database, get the (approximate, from the CDS
+        coordinates) number of aa residues of each BGC,
+        e.g. to estimate the cost of scanning them,
+        returns {bgc_id: residues}"""
+
+        return dict(database.select(
+            "cds",
+            "WHERE bgc_id IN (" +
+            database.temp_ids("bgc_ids", bgc_ids) + ")" +
+            " GROUP BY bgc_id",
+            props=["bgc_id", "sum(nt_end - nt_start) / 3"],
+            as_tuples=True
+        ))
+
+    def get_aligned_residue_counts(bgc_ids: List[int],
+                                   hmm_weights: Dict[int, int],
+                                   database: Database):
+        """query database, get the number of aligned residues of
+        the hsps of each BGC, weighted by their hmm_id (e.g. with
+        the number of sub_pfams to scan them with), returns
+        {bgc_id: weighted residues}, see get_all_aligned_hsp()"""
+
+        results = {}
+        for bgc_id, hmm_id, residues in database.select(
             "cds,hsp,hsp_alignment",
             "WHERE cds.id=hsp.cds_id" +
             " AND hsp.id=hsp_alignment.hsp_id" +
-            " AND cds.bgc_id IN (" + ",".join(map(str, bgc_ids)) + ")" +
-            " AND hsp.hmm_id IN (" + ",".join(map(str, hmm_ids)) + ")",
-            props=["bgc_id", "hsp.id as hsp_id", "hmm_id", "cds.id",
-                   "aa_seq", "hsp_alignment.*"]
+            " AND cds.bgc_id IN (" +
+            database.temp_ids("bgc_ids", bgc_ids) + ")" +
+            " AND hsp.hmm_id IN (" +
+            database.temp_ids("hmm_ids", list(hmm_weights.keys())) + ")" +
+            " GROUP BY cds.bgc_id, hsp.hmm_id",
+            props=["cds.bgc_id", "hsp.hmm_id", "sum(cds_end - cds_start)"],
+            as_tuples=True
+        ):
+            results[bgc_id] = results.get(bgc_id, 0) + \
+                residues * hmm_weights[hmm_id]
+        return results
+
+    def get_all_aligned_hsp(bgc_ids: List[int], hmm_ids: List[int],
+                            database: Database,
+                            seen_hsp_groups: Set[Tuple[int, int]]=None,
+                            duplicates: List[
+                                Tuple[int, int, int, int]]=None):
+        """query database, get all aligned hsp
+        hits from the list of hmm ids, returns {hmm_id:
+        [((bgc_id, cds_id, hsp_id, cds_start), aligned sequence)]}
+        seen_hsp_groups: if given, hsps of the same hmm on the same
+        aa sequence (i.e. identical aligned sequences) are returned
+        only once, skip the (aa_seq_id, hmm_id) in it and add the
+        returned ones to it, the skipped hsps are appended to
+        duplicates as (aa_seq_id, hmm_id, cds_id, hsp_id)"""
+
+        rows = database.select_iter(
+            "cds,protein,hsp,hsp_alignment",
+            "WHERE cds.id=hsp.cds_id" +
+            " AND cds.aa_seq_id=protein.id" +
+            " AND hsp.id=hsp_alignment.hsp_id" +
+            " AND cds.bgc_id IN (" +
+            database.temp_ids("bgc_ids", bgc_ids) + ")" +
+            " AND hsp.hmm_id IN (" +
+            database.temp_ids("hmm_ids", hmm_ids) + ")",
+            props=["bgc_id", "hsp.id", "hmm_id", "cds.id",
+                   "aa_seq_id", "aa_seq", "cds_start", "cds_end",
+                   "cds_gaps", "model_gaps"]
         )
 
         results = {}
-        for row in rows:
-            bgc_id = row["bgc_id"]
-            hmm_id = row["hmm_id"]
+        for (bgc_id, hsp_id, hmm_id, cds_id, aa_seq_id, aa_seq,
+             cds_start, cds_end, cds_gaps, model_gaps) in rows:
+            if seen_hsp_groups is not None:
+                group_key = (aa_seq_id, hmm_id)
+                if group_key in seen_hsp_groups:
+                    if duplicates is not None:
+                        duplicates.append(
+                            (aa_seq_id, hmm_id, cds_id, hsp_id))
+                    continue
+                seen_hsp_groups.add(group_key)
             if hmm_id not in results:
-                results[hmm_id] = ""
-
-            # restore aligned-to-model sequences
-            aln = ""
-            hit_prot = row["aa_seq"][row["cds_start"]:row["cds_end"]]
-            skips = 0
-            cds_gaps = [int(gap)
-                        for gap in row[
-                        "cds_gaps"].split(",") if len(gap) > 0]
-            model_gaps = [int(gap)
-                          for gap in row[
-                          "model_gaps"].split(",") if len(gap) > 0]
-            len_full = row["cds_end"] - row["cds_start"] + len(cds_gaps)
-
-            for i in range(len_full):
-                if i not in model_gaps:
-                    if i not in cds_gaps:
-                        aln += hit_prot[i - skips]
-                    else:
-                        skips += 1
-
-            results[hmm_id] += ">bgc:{}|cds:{}|hsp:{}|{}-{}\n".format(
-                bgc_id, row["id"], row["hsp_id"],
-                row["cds_start"],
-                row["cds_end"])
-            results[hmm_id] += "{}\n".format(aln)
+                results[hmm_id] = []
+
+            # restore aligned-to-model sequences: of the alignment
+            # columns, model gaps (insertions) are dropped and cds
+            # gaps (deletions) don't consume a residue
+            hit_prot = np.frombuffer(decompress_aa_seq(aa_seq)[
+                cds_start:cds_end].encode("utf-8"), dtype=np.uint8)
+            cds_gaps = decode_gaps(cds_gaps)
+            len_full = cds_end - cds_start + cds_gaps.size
+            is_model_gap = np.zeros(len_full, dtype=bool)
+            is_model_gap[decode_gaps(model_gaps)] = True
+            is_cds_gap = np.zeros(len_full, dtype=bool)
+            is_cds_gap[cds_gaps] = True
+            is_cds_gap &= ~is_model_gap
+            residues = np.arange(len_full) - (
+                np.cumsum(is_cds_gap) - is_cds_gap)
+            aln = hit_prot[residues[~(is_model_gap | is_cds_gap)]
+                           ].tobytes().decode("utf-8")
+
+            results[hmm_id].append(
+                ((bgc_id, cds_id, hsp_id, cds_start), aln))
         return results
 
     class ChemSubclass:
@@ -289,14 +413,15 @@ class BGC:
             self.class_name = properties["class_name"]
             self.orig_class = properties["class_source"]
 
-        def __save__(self, database: Database):
+        def __save__(self, database: Database, check_existing: bool=True):
             """commit bgc_class
-            this only meant to be called from BGC.save()"""
+            this only meant to be called from BGC.save()
+            check_existing: set to False when the BGC is new"""
             existing = database.select(
                 "bgc_class",
                 "WHERE bgc_id=? AND chem_subclass_id=?",
                 parameters=(self.bgc_id, self.subclass_id)
-            )
+            ) if check_existing else []
             if existing:
                 # for now, this should not get called
                 raise Exception("not_implemented")
@@ -313,6 +438,23 @@ class BGC:
                     }
                 )
 
+        @staticmethod
+        def save_all(bgc_id: int, bgc_type: str, chem_subclasses: List[str],
+                     database: Database,
+                     chem_resolver: "BGC.ChemSubclassResolver"=None):
+            """commit the bgc_class of a new BGC
+            this only meant to be called from BGC.save()
+            (or BGC.Batch.save())"""
+            for cc in chem_subclasses:
+                if chem_resolver:
+                    chem_subclass_object = chem_resolver.search(
+                        cc, bgc_type)
+                else:
+                    chem_subclass_object = BGC.ChemSubclass.search(
+                        database, cc, bgc_type)
+                chem_subclass_object.bgc_id = bgc_id
+                chem_subclass_object.__save__(database, check_existing=False)
+
         @staticmethod
         def search(database: Database, name: str, source_type: str):
             rows = database.select(
@@ -347,12 +489,57 @@ class BGC:
                 row["class_source"] = name
                 return BGC.ChemSubclass(row)
 
+    class ChemSubclassResolver:
+        """In-memory copy of the chem_subclass_map, does the same
+        as BGC.ChemSubclass.search() without querying the database"""
+
+        def __init__(self, database: Database):
+            self._rows = {}
+            for row in database.select(
+                "chem_class,chem_subclass,chem_subclass_map",
+                "WHERE chem_subclass_map.subclass_id=chem_subclass.id AND " +
+                "chem_class.id=chem_subclass.class_id",
+                props=["subclass_id", "class_id", "class_source",
+                       "type_source",
+                       "chem_class.name as class_name",
+                       "chem_subclass.name as subclass_name"]
+            ):
+                key = (row.pop("type_source"), row["class_source"])
+                # if exists, something is wrong with chem_class_map.tsv
+                assert key not in self._rows
+                self._rows[key] = row
+
+            rows_unknown = database.select(
+                "chem_class,chem_subclass",
+                "WHERE chem_class.id=chem_subclass.class_id" +
+                " AND class_name=? AND subclass_name=?",
+                parameters=("Unknown", "unknown"),
+                props=["chem_subclass.id as subclass_id", "class_id",
+                       "chem_class.name as class_name",
+                       "chem_subclass.name as subclass_name"]
+            )
+            # if != 1, something is wrong with the database
+            assert len(rows_unknown) == 1
+            self._unknown = rows_unknown[0]
+
+        def search(self, name: str, source_type: str):
+            row = self._rows.get((source_type, name), None)
+            if row is None:
+                # assign Unknown-unknown
+                row = dict(self._unknown)
+                row["class_source"] = name
+            return BGC.ChemSubclass(row)
+
     class CDS:
         """Represents a CDS in the database
         CDS can't exists without a BGC"""
 
+        __slots__ = ("id", "bgc_id", "nt_start", "nt_end", "strand",
+                     "locus_tag", "protein_id", "product", "aa_seq")
+
         def __init__(self, properties: dict):
             self.id = properties.get("id", -1)
+            self.bgc_id = properties.get("bgc_id", -1)
             self.nt_start = properties["nt_start"]
             self.nt_end = properties["nt_end"]
             self.strand = properties["strand"]
@@ -361,16 +548,19 @@ class BGC:
             self.product = properties["product"]
             self.aa_seq = properties["aa_seq"]
 
-        def __save__(self, database: Database):
+        def __save__(self, database: Database,
+                     protein_ids: Dict[str, int]=None,
+                     check_existing: bool=True):
             """commit cds
-            this only meant to be called from BGC.save()"""
+            this only meant to be called from BGC.save()
+            check_existing: set to False when the BGC is new"""
             existing = database.select(
                 "cds",
                 "WHERE bgc_id=?" +
                 " AND nt_start=? AND nt_end=?",
                 parameters=(self.bgc_id, self.nt_start, self.nt_end),
                 props=["id"]
-            )
+            ) if check_existing else []
             if existing:
                 # for now, this should not get called
                 raise Exception("not_implemented")
@@ -391,12 +581,14 @@ class BGC:
                         "locus_tag": self.locus_tag,
                         "protein_id": self.protein_id,
                         "product": self.product,
-                        "aa_seq": self.aa_seq
+                        "aa_seq_id": BGC.Protein.get_id(
+                            self.aa_seq, database, protein_ids)
                     }
                 )
 
         @staticmethod
         def from_feature(feature: SeqFeature):
+            """feature: a Bio.SeqFeature or a gbk.GBKFeature"""
             def get_prop(prop):
                 return feature.qualifiers.get(prop, [None])[0]
             loc = feature.location
@@ -410,3 +602,176 @@ class BGC:
                 "aa_seq": get_prop("translation")
             }
             return BGC.CDS(properties)
+
+    class Protein:
+        """Represents a unique CDS aa sequence in the database
+        ('protein' table, keyed by the md5 of the sequence)"""
+
+        @staticmethod
+        def get_id(aa_seq: str, database: Database,
+                   protein_ids: Dict[str, int]=None, seq_md5: str=None):
+            """fetch the id of aa_seq's protein entry,
+            insert a new one if it doesn't exist yet
+            protein_ids: {md5: id} of previously fetched/inserted
+            proteins, to be shared by all get_id() calls on the
+            database (skips the insert buffer lookup, so it may only
+            be emptied right after a commit_inserts(), e.g. to
+            keep only the proteins of the current batch)
+            seq_md5: md5 of aa_seq, if already computed"""
+
+            if seq_md5 is None:
+                seq_md5 = md5(aa_seq.encode("utf-8")).hexdigest()
+            if protein_ids is not None and seq_md5 in protein_ids:
+                return protein_ids[seq_md5]
+
+            existing = database.select(
+                "protein",
+                "WHERE md5=?",
+                parameters=(seq_md5,),
+                props=["id"]
+            )
+            if existing:
+                aa_seq_id = existing[0]["id"]
+            else:
+                if protein_ids is not None:
+                    pending_ids = []
+                else:
+                    database.declare_pending_index("protein", ["md5"])
+                    pending_ids = database.get_pending_id(
+                        "protein", {"md5": seq_md5})
+                if len(pending_ids) > 0:
+                    aa_seq_id = pending_ids[0]
+                else:
+                    aa_seq_id = database.insert(
+                        "protein",
+                        {
+                            "md5": seq_md5,
+                            "aa_seq": compress_aa_seq(aa_seq)
+                        }
+                    )
+            if protein_ids is not None:
+                protein_ids[seq_md5] = aa_seq_id
+            return aa_seq_id
+
+    class Batch:
+        """Compact (columnar) form of a list of parsed BGCs, used
+        to pass them from the parsing workers to the parent process
+        (a few buffers to pickle instead of one object per BGC/CDS),
+        BGC.Batch.save() inserts them without rebuilding the objects"""
+
+        # per-CDS columns, text columns are the lengths of the values
+        # in the concatenated text/aa_seqs buffers (-1 for None)
+        CDS_DTYPE = np.dtype([
+            ("nt_start", np.int64),
+            ("nt_end", np.int64),
+            ("strand", np.int8),
+            ("locus_tag", np.int32),
+            ("protein_id", np.int32),
+            ("product", np.int32),
+            ("aa_seq", np.int32),
+            ("aa_seq_md5", "S32")
+        ])
+        NO_STRAND = -128  # strand is None
+
+        __slots__ = ("bgcs", "cds", "text", "aa_seqs")
+
+        def __init__(self, bgcs: List["BGC"]):
+            self.bgcs = [
+                (bgc.name, bgc.type, bgc.on_contig_edge, bgc.length_nt,
+                 bgc.orig_folder, bgc.orig_filename,
+                 tuple(bgc.chem_subclasses), len(bgc.cds))
+                for bgc in bgcs]
+            cds_rows = []
+            text = []
+            aa_seqs = []
+
+            def add_text(buffer: list, value: str):
+                if value is None:
+                    return -1
+                buffer.append(value)
+                return len(value)
+
+            for bgc in bgcs:
+                for cds in bgc.cds:
+                    cds_rows.append((
+                        cds.nt_start,
+                        cds.nt_end,
+                        BGC.Batch.NO_STRAND if cds.strand is None
+                        else cds.strand,
+                        add_text(text, cds.locus_tag),
+                        add_text(text, cds.protein_id),
+                        add_text(text, cds.product),
+                        add_text(aa_seqs, cds.aa_seq),
+                        md5(cds.aa_seq.encode("utf-8")).hexdigest()
+                        if cds.aa_seq is not None else ""
+                    ))
+            self.cds = np.array(cds_rows, dtype=BGC.Batch.CDS_DTYPE)
+            self.text = "".join(text)
+            self.aa_seqs = "".join(aa_seqs)
+
+        def __len__(self):
+            return len(self.bgcs)
+
+        def save(self, dataset_id: int, database: Database,
+                 protein_ids: Dict[str, int]=None,
+                 chem_resolver: "BGC.ChemSubclassResolver"=None):
+            """commits the BGCs as new ones, see BGC.save()
+            (dataset_id is None for query mode databases),
+            returns the assigned bgc ids"""
+
+            bgc_ids = []
+            cds_rows = iter(self.cds.tolist())
+            text_pos = 0
+            seq_pos = 0
+
+            def next_text(buffer: str, pos: int, length: int):
+                if length < 0:
+                    return None, pos
+                return buffer[pos:pos + length], pos + length
+
+            for (name, bgc_type, on_contig_edge, length_nt, orig_folder,
+                    orig_filename, chem_subclasses, num_cds) in self.bgcs:
+                bgc_data = {} if dataset_id is None else {
+                    "dataset_id": dataset_id}
+                bgc_data.update({
+                    "name": name,
+                    "type": bgc_type,
+                    "on_contig_edge": on_contig_edge,
+                    "length_nt": length_nt,
+                    "orig_folder": orig_folder,
+                    "orig_filename": orig_filename
+                })
+                bgc_id = database.insert("bgc", bgc_data)
+                bgc_ids.append(bgc_id)
+                BGC.ChemSubclass.save_all(
+                    bgc_id, bgc_type, chem_subclasses, database,
+                    chem_resolver)
+                for _ in range(num_cds):
+                    (nt_start, nt_end, strand, locus_tag_len,
+                     protein_id_len, product_len, aa_seq_len,
+                     aa_seq_md5) = next(cds_rows)
+                    locus_tag, text_pos = next_text(
+                        self.text, text_pos, locus_tag_len)
+                    protein_id, text_pos = next_text(
+                        self.text, text_pos, protein_id_len)
+                    product, text_pos = next_text(
+                        self.text, text_pos, product_len)
+                    aa_seq, seq_pos = next_text(
+                        self.aa_seqs, seq_pos, aa_seq_len)
+                    database.insert(
+                        "cds",
+                        {
+                            "bgc_id": bgc_id,
+                            "nt_start": nt_start,
+                            "nt_end": nt_end,
+                            "strand": None if strand == BGC.Batch.NO_STRAND
+                            else strand,
+                            "locus_tag": locus_tag,
+                            "protein_id": protein_id,
+                            "product": product,
+                            "aa_seq_id": BGC.Protein.get_id(
+                                aa_seq, database, protein_ids,
+                                aa_seq_md5.decode("ascii") or None)
+                        }
+                    )
+            return bgc_ids
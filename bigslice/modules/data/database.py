@@ -9,11 +9,14 @@
 Common classes and functions to work with the SQLite3 database
 """
 
+from contextlib import closing
 from os import path
 from shutil import move
 import re
 import sqlite3
 from time import time
+from typing import Iterable, List
+from .temp_ids import load_temp_ids
 
 
 class Database:
@@ -26,8 +29,16 @@ class Database:
         self.close()
 
     def __init__(self, db_path: str, use_memory: bool=False,
-                 for_query_mode: bool=False):
+                 for_query_mode: bool=False,
+                 memory_tables: List[str]=None,
+                 checkpoints: bool=False):
         """db_path: path to sqlite3 database file
+        memory_tables: with use_memory, only load these tables
+        (plus the schema) of an existing database, the others will
+        be empty (the database then can't be dumped back to its file)
+        checkpoints: with use_memory, keep track of the new and
+        updated rows, so that checkpoint() only needs to write those
+        into the database file (instead of dumping the whole database)
         CAUTION: this should not be subjected to
         multiple processes (at least for the insert
         function"""
@@ -35,9 +46,21 @@ class Database:
         self._db_path = db_path
         self._insert_queues = []
         self._insert_queues_index = {}
+        # {table: {sorted keys: {values: [pending ids]}}},
+        # see declare_pending_index()
+        self._pending_indexes = {}
         self._last_indexes = {}
         self._connection = None
         self._use_memory = use_memory
+        self._memory_tables = memory_tables
+        # {table: max rowid} written into the file by the last
+        # checkpoint (None: the file is not in sync yet), and
+        # {table: rowids} updated since then, see checkpoint()
+        self._checkpoints = checkpoints and use_memory
+        self._checkpoint_rowids = None
+        self._updated_rowids = {}
+        # [(name, sql)] of the indexes dropped by defer_indexes()
+        self._deferred_indexes = []
 
         if for_query_mode:
             # truncated database object for query mode
@@ -62,19 +85,28 @@ class Database:
 
         if path.exists(self._db_path):
             if (self._use_memory):
-                with sqlite3.connect(self._db_path) as db_con:
-                    query = "".join(line for line in db_con.iterdump())
-                    self._connection = sqlite3.connect(":memory:")
-                    self._connection.executescript(query)
+                self._load_db_file(memory_tables)
+                if self._checkpoints:
+                    if memory_tables is not None:
+                        raise Exception(
+                            "can't checkpoint a partially loaded database")
+                    self._checkpoint_rowids = self._get_max_rowids()
             else:
                 self._connection = sqlite3.connect(self._db_path)
             # check if existing one have the same schema version
             db_schema_ver = self.select("schema", "WHERE 1")[0]["ver"]
             if db_schema_ver != self.schema_ver:
                 raise Exception(
-                    "SQLite3 database exists but contains different schema " +
-                    "version ({} rather than {}), exiting!".format(
+                    ("SQLite3 database exists but contains different schema " +
+                     "version ({} rather than {}), exiting! (an output " +
+                     "folder made by an older version can be upgraded " +
+                     "with: bigslice --upgrade_db <output_folder>)").format(
                         db_schema_ver, self.schema_ver))
+            # re-create any index left dropped by an interrupted
+            # bulk-load phase (see defer_indexes())
+            self._connection.executescript("\n".join(re.findall(
+                r"CREATE (?:UNIQUE )?INDEX IF NOT EXISTS [^;]+;",
+                sql_schema)))
         else:
             # create new database
             if (self._use_memory):
@@ -146,12 +178,176 @@ class Database:
             self._last_indexes[row["name"]] = row["seq"]
 
     def close(self):
-        if self._use_memory:
-            self.dump_db_file()
+        self.rebuild_indexes()
+        if self._use_memory and self._memory_tables is None:
+            self.checkpoint()
         self._connection.close()
 
+    def _get_max_rowids(self):
+        """{table: max rowid} of all tables"""
+        max_rowids = {}
+        for row in self.select(
+                "sqlite_master",
+                "WHERE type='table' AND name NOT LIKE 'sqlite_%'",
+                props=["name"], as_tuples=True):
+            max_rowids[row[0]] = self.select(
+                row[0], "", props=["max(rowid)"],
+                as_tuples=True)[0][0] or 0
+        return max_rowids
+
+    def checkpoint(self, chunk_size: int=900):
+        """write the in-memory database into its file: only the rows
+        inserted or updated since the previous checkpoint if the
+        database tracks them (see __init__), otherwise (or for the
+        first checkpoint of a new database) the whole database
+        (see dump_db_file())"""
+
+        if not self._checkpoints or self._checkpoint_rowids is None:
+            self.dump_db_file()
+            if self._checkpoints:
+                self._checkpoint_rowids = self._get_max_rowids()
+                self._updated_rowids = {}
+            return
+
+        start = time()
+        print("Writing changes into " +
+              self._db_path + "...", end=" ", flush=True)
+        self._connection.commit()
+        max_rowids = self._get_max_rowids()
+        num_inserted = 0
+        num_updated = 0
+        db_cur = self._connection.cursor()
+        db_cur.execute("ATTACH DATABASE ? AS disk", (self._db_path,))
+        try:
+            db_cur.execute("BEGIN")
+            for table, max_rowid in max_rowids.items():
+                last_rowid = self._checkpoint_rowids.get(table, 0)
+                updated_rowids = [
+                    rowid for rowid in self._updated_rowids.get(table, [])
+                    if rowid <= last_rowid]
+                if max_rowid <= last_rowid and not updated_rowids:
+                    continue
+                # copy the rowids as well (unless it's the INTEGER
+                # PRIMARY KEY) so that the file stays identical
+                columns = []
+                has_rowid_alias = False
+                for row in db_cur.execute(
+                        "PRAGMA main.table_info({})".format(table)
+                ).fetchall():
+                    columns.append(row[1])
+                    if row[5] == 1 and row[2].upper() == "INTEGER":
+                        has_rowid_alias = True
+                if not has_rowid_alias:
+                    columns.insert(0, "rowid")
+                columns = ",".join(columns)
+                if max_rowid > last_rowid:
+                    db_cur.execute((
+                        "INSERT INTO disk.{0}({1}) SELECT {1}"
+                        " FROM main.{0} WHERE rowid>?"
+                    ).format(table, columns), (last_rowid,))
+                    num_inserted += db_cur.rowcount
+                for i in range(0, len(updated_rowids), chunk_size):
+                    chunk = updated_rowids[i:i + chunk_size]
+                    db_cur.execute((
+                        "INSERT OR REPLACE INTO disk.{0}({1}) SELECT {1}"
+                        " FROM main.{0} WHERE rowid IN ({2})"
+                    ).format(table, columns, ",".join(["?"] * len(chunk))),
+                        tuple(chunk))
+                    num_updated += len(chunk)
+            db_cur.execute("DELETE FROM disk.sqlite_sequence")
+            db_cur.execute("INSERT INTO disk.sqlite_sequence" +
+                           " SELECT * FROM main.sqlite_sequence")
+            self._connection.commit()
+        except Exception:
+            self._connection.rollback()
+            raise
+        finally:
+            db_cur.execute("DETACH DATABASE disk")
+        self._checkpoint_rowids = max_rowids
+        self._updated_rowids = {}
+        print("{0:.4f}s ({1} new rows, {2} updated rows)".format(
+            time() - start, num_inserted, num_updated))
+
+    def _load_db_file(self, tables: List[str]=None):
+        """load the database file into an in-memory database, using
+        the backup API (i.e. page by page, the mirror of
+        dump_db_file()), or only the listed tables if specified"""
+        start = time()
+        print("Loading database content from " +
+              self._db_path + " into memory...", end=" ", flush=True)
+        self._connection = sqlite3.connect(":memory:")
+        if tables is None:
+            with closing(sqlite3.connect(self._db_path)) as in_db:
+                in_db.backup(self._connection)
+        else:
+            tables = set(tables) | {"schema"}
+            db_cur = self._connection.cursor()
+            db_cur.execute("ATTACH DATABASE ? AS source", (self._db_path,))
+            schema = db_cur.execute(
+                "SELECT type, name, sql FROM source.sqlite_master" +
+                " WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+            # tables first, indexes (etc.) after the data is in
+            for obj_type, name, sql in schema:
+                if obj_type == "table":
+                    db_cur.execute(sql)
+                    if name in tables:
+                        db_cur.execute(
+                            "INSERT INTO main.{0} SELECT * FROM source.{0}"
+                            .format(name))
+            # keep all AUTOINCREMENT counters as they are
+            db_cur.execute("DELETE FROM main.sqlite_sequence")
+            db_cur.execute("INSERT INTO main.sqlite_sequence" +
+                           " SELECT * FROM source.sqlite_sequence")
+            for obj_type, _, sql in schema:
+                if obj_type != "table":
+                    db_cur.execute(sql)
+            self._connection.commit()
+            db_cur.execute("DETACH DATABASE source")
+        page_count = self._connection.execute(
+            "PRAGMA page_count").fetchone()[0]
+        print("{0:.4f}s ({1} pages{2})".format(
+            time() - start, page_count,
+            "" if tables is None else ", tables: " + ",".join(
+                sorted(tables))))
+
+    def defer_indexes(self, names: List[str]):
+        """bulk-load mode: drop these (secondary) indexes so that
+        they are not maintained on every INSERT, until
+        rebuild_indexes() is called"""
+        db_cur = self._connection.cursor()
+        for name in names:
+            row = db_cur.execute(
+                "SELECT sql FROM sqlite_master WHERE type='index'" +
+                " AND name=? AND sql IS NOT NULL", (name,)).fetchone()
+            if row is None:  # already deferred, or not in this schema
+                continue
+            db_cur.execute("DROP INDEX {}".format(name))
+            self._deferred_indexes.append((name, row[0]))
+        self._connection.commit()
+
+    def rebuild_indexes(self):
+        """re-create the indexes dropped by defer_indexes()
+        (each in a single sorted pass over its table), returns
+        the time it took"""
+        if not self._deferred_indexes:
+            return 0
+        start = time()
+        print("Rebuilding {} indexes...".format(
+            len(self._deferred_indexes)), end=" ", flush=True)
+        db_cur = self._connection.cursor()
+        for _, sql in self._deferred_indexes:
+            db_cur.execute(sql)
+        self._connection.commit()
+        self._deferred_indexes = []
+        elapsed = time() - start
+        print("{0:.4f}s".format(elapsed))
+        return elapsed
+
     def dump_db_file(self):
-        if self._use_memory:
+        if self._use_memory and self._memory_tables is not None:
+            raise(Exception("can't dump a partially loaded database"))
+        elif self._use_memory:
             start = time()
             print("Dumping in-memory database content into " +
                   self._db_path + "...", end=" ", flush=True)
@@ -169,19 +365,7 @@ class Database:
                as_tuples: bool = False):
         """execute a SELECT ... FROM ... WHERE"""
 
-        if len(props) < 1:
-            props_string = "*"
-        else:
-            props_string = ",".join(props)
-
-        if distinct:
-            props_string = "DISTINCT " + props_string
-
-        sql = "SELECT {} FROM {} {}".format(
-            props_string,
-            table,
-            clause
-        )
+        sql = self._select_sql(table, clause, props, distinct)
 
         def dict_factory(cursor, row):
             """see https://docs.python.org/2/library/
@@ -204,6 +388,56 @@ class Database:
         self._connection.row_factory = orig_row_factory
         return results
 
+    def select_iter(self, table: str, clause: str,
+                    parameters: tuple = None, props: list = [],
+                    distinct: bool = False,
+                    as_rows: bool = False,
+                    fetch_size: int = 10000):
+        """like select(), but yields the rows as they are fetched
+        (fetch_size rows at a time) instead of fetching them all
+        first, as plain tuples, or sqlite3.Row if as_rows
+        (accessible both by index and by column name)"""
+
+        sql = self._select_sql(table, clause, props, distinct)
+        db_cur = self._connection.cursor()
+        if as_rows:
+            db_cur.row_factory = sqlite3.Row
+        if parameters:
+            db_cur.execute(sql, parameters)
+        else:
+            db_cur.execute(sql)
+        try:
+            while True:
+                rows = db_cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            db_cur.close()
+
+    def temp_ids(self, name: str, ids: Iterable[int]):
+        """load ids into the TEMP table <name>, returns the subquery
+        to use in place of an "IN (...)" list, see load_temp_ids()"""
+        subquery = load_temp_ids(self._connection, name, ids)
+        self._connection.commit()
+        return subquery
+
+    @staticmethod
+    def _select_sql(table: str, clause: str, props: list, distinct: bool):
+        if len(props) < 1:
+            props_string = "*"
+        else:
+            props_string = ",".join(props)
+
+        if distinct:
+            props_string = "DISTINCT " + props_string
+
+        return "SELECT {} FROM {} {}".format(
+            props_string,
+            table,
+            clause
+        )
+
     def update(self, table: str, data: dict, clause: str,
                parameters: tuple = ()):
         """execute an UPDATE ... SET ... WHERE ..."""
@@ -224,11 +458,39 @@ class Database:
         )
 
         db_cur = self._connection.cursor()
+        if self._checkpoint_rowids is not None:
+            # rows to be re-written by the next checkpoint()
+            self._updated_rowids.setdefault(table, set()).update(
+                row[0] for row in db_cur.execute(
+                    "SELECT rowid FROM {} {}".format(table, clause),
+                    tuple(parameters)))
         db_cur.execute(sql, tuple(set_params))
         self._connection.commit()
 
         return db_cur.rowcount
 
+    def update_many(self, table: str, columns: List[str],
+                    rows: List[tuple]):
+        """execute an UPDATE ... SET <columns> WHERE id=? for each
+        of the rows ((values of the columns..., id)), as a single
+        executemany (and commit), returns the number of updated rows"""
+
+        sql = "UPDATE {} SET {} WHERE id=?".format(
+            table,
+            ",".join(column + "=?" for column in columns)
+        )
+
+        db_cur = self._connection.cursor()
+        if self._checkpoint_rowids is not None:
+            # rows to be re-written by the next checkpoint()
+            # (id is the rowid)
+            self._updated_rowids.setdefault(table, set()).update(
+                row[-1] for row in rows)
+        db_cur.executemany(sql, rows)
+        self._connection.commit()
+
+        return db_cur.rowcount
+
     def insert(self, table: str, data: dict):
         """execute an INSERT INTO ... VALUES ...
         !!don't use the returned IDs unless you are sure
@@ -242,8 +504,47 @@ class Database:
         if table not in self._insert_queues_index:
             self._insert_queues_index[table] = []
         self._insert_queues_index[table].append(len(self._insert_queues) - 1)
+        for keys, index in self._pending_indexes.get(table, {}).items():
+            self._index_pending_row(index, keys, data, new_id)
         return new_id
 
+    @staticmethod
+    def _index_pending_row(index: dict, keys: tuple, data: dict,
+                           pending_id: int):
+        try:
+            values = tuple(data[key] for key in keys)
+        except KeyError:
+            return
+        if values not in index:
+            index[values] = []
+        index[values].append(pending_id)
+
+    def declare_pending_index(self, table: str, keys: List[str]):
+        """keep a hash index of the insert buffer over these keys,
+        so that get_pending_id() queries using exactly these
+        keys don't have to scan the whole buffer"""
+        keys = tuple(sorted(keys))
+        if keys in self._pending_indexes.get(table, {}):
+            return
+        index = {}
+        for buffer_idx in self._insert_queues_index.get(table, []):
+            _, buffer_data, pending_id = self._insert_queues[buffer_idx]
+            self._index_pending_row(index, keys, buffer_data, pending_id)
+        self._pending_indexes.setdefault(table, {})[keys] = index
+
+    @staticmethod
+    def _execute_inserts(db_cur: sqlite3.Cursor, table: str,
+                         keys: tuple, rows: list):
+        """INSERT rows (tuples of values for keys) into table"""
+        if not rows:
+            return
+        sql = "INSERT INTO {}({}) VALUES ({})".format(
+            table,
+            ",".join(keys),
+            ",".join(["?"] * len(keys))
+        )
+        db_cur.executemany(sql, rows)
+
     def get_pending_id(self, table: str, query: dict):
         """try to look for a match in the insert buffer,
         and returns the pending id
@@ -251,6 +552,12 @@ class Database:
         that the INSERTs all will be successful and there
         is no other sources tinkering with the database"""
 
+        keys = tuple(sorted(query))
+        index = self._pending_indexes.get(table, {}).get(keys, None)
+        if index is not None:
+            return list(index.get(
+                tuple(query[key] for key in keys), []))
+
         ids = []
         for buffer_idx in self._insert_queues_index.get(table, []):
             _, buffer_data, pending_id = self._insert_queues[buffer_idx]
@@ -265,26 +572,33 @@ class Database:
         return ids
 
     def commit_inserts(self):
-        """perform actual commit for the insert queue"""
+        """perform actual commit for the insert queue
+        (one executemany per run of consecutive rows of a table
+        having the same columns, rows of a table are inserted in
+        the order they were queued so that the pre-assigned ids
+        stay valid)"""
 
         db_cur = self._connection.cursor()
-        for table, data, _ in self._insert_queues:
-            keys = []
-            values = []
-            for key, value in data.items():
-                if key == "id":  # can't have this around!
-                    raise Exception("Don't specify id for INSERTs!")
-                keys.append(key)
-                values.append(value)
-            sql = "INSERT INTO {}({}) VALUES ({})".format(
-                table,
-                ",".join(keys),
-                ",".join(["?" for i in range(len(values))])
-            )
-            db_cur.execute(sql, tuple(values))
+        for table, buffer_idxs in self._insert_queues_index.items():
+            keys = None
+            rows = []
+            for buffer_idx in buffer_idxs:
+                data = self._insert_queues[buffer_idx][1]
+                data_keys = tuple(data.keys())
+                if data_keys != keys:
+                    if "id" in data_keys:  # can't have this around!
+                        raise Exception("Don't specify id for INSERTs!")
+                    self._execute_inserts(db_cur, table, keys, rows)
+                    keys = data_keys
+                    rows = []
+                rows.append(tuple(data.values()))
+            self._execute_inserts(db_cur, table, keys, rows)
         self._connection.commit()
         self._insert_queues = []
         self._insert_queues_index = {}
+        for table_indexes in self._pending_indexes.values():
+            for index in table_indexes.values():
+                index.clear()
 
         # sanity check
         for row in self.select("sqlite_sequence", "WHERE 1"):
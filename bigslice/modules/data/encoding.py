@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.encoding
+
+Binary encoding of the bulky column values: the hsp_alignment gap
+lists (delta + varint-encoded BLOBs, see find_gaps() for getting them
+from the aligned sequences) and the protein sequences
+(zlib-compressed BLOBs)
+"""
+
+import zlib
+import numpy as np
+from typing import Iterable, Union
+
+# bytes needed by a 64-bit varint
+_MAX_VARINT_BYTES = 10
+
+
+def find_gaps(aligned_sequence: Union[str, bytes], gap_char: str):
+    """positions of the gap_char ('.' for the insertions in a model
+    sequence, '-' for the deletions in a target sequence) of an
+    aligned sequence, as a numpy array (see encode_gaps())"""
+    if isinstance(aligned_sequence, str):
+        aligned_sequence = aligned_sequence.encode("latin-1")
+    return np.flatnonzero(
+        np.frombuffer(aligned_sequence, dtype=np.uint8) == ord(gap_char))
+
+
+def encode_gaps(gaps: Iterable[int]):
+    """encode an ascending list of positions as the varints (7 bits
+    per byte, least significant first, high bit set on all but the
+    last byte) of the differences to the previous position"""
+    deltas = np.diff(np.asarray(gaps, dtype=np.uint64),
+                     prepend=np.uint64(0))
+    if deltas.size < 1:
+        return b""
+    num_bytes = np.ones(deltas.size, dtype=np.int64)
+    for i in range(1, _MAX_VARINT_BYTES):
+        num_bytes += deltas >= np.uint64(1 << (7 * i))
+    shifts = np.arange(num_bytes.max(), dtype=np.uint64) * np.uint64(7)
+    # (gaps, bytes) grid, flattened row-wise and masked to num_bytes
+    grid = (deltas[:, None] >> shifts[None, :]) & np.uint64(0x7f)
+    used = np.arange(shifts.size)[None, :] < num_bytes[:, None]
+    grid[np.arange(shifts.size)[None, :] < (num_bytes[:, None] - 1)] |= \
+        np.uint64(0x80)
+    return grid[used].astype(np.uint8).tobytes()
+
+
+def decode_gaps(blob: bytes):
+    """decode the positions encoded by encode_gaps(),
+    returns them as a numpy array"""
+    data = np.frombuffer(blob, dtype=np.uint8)
+    if data.size < 1:
+        return np.zeros(0, dtype=np.int64)
+    is_last = (data & 0x80) == 0
+    starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    value_idx = np.cumsum(np.concatenate(([0], is_last[:-1])))
+    shifts = (np.arange(data.size) - starts[value_idx]) * 7
+    deltas = np.add.reduceat(
+        (data & 0x7f).astype(np.int64) << shifts, starts)
+    return np.cumsum(deltas)
+
+
+def compress_aa_seq(aa_seq: str):
+    """zlib-compress a protein sequence"""
+    return zlib.compress(aa_seq.encode("utf-8"))
+
+
+def decompress_aa_seq(blob: bytes):
+    """restore a sequence compressed by compress_aa_seq()"""
+    return zlib.decompress(blob).decode("utf-8")
@@ -82,14 +82,15 @@ class Features:
         # fetch features
         features = []
         hsps = {bgc_id: {} for bgc_id in bgc_ids}
-        for bgc_id, cds_id, hmm_id, bitscore in database.select(
+        for bgc_id, cds_id, hmm_id, bitscore in database.select_iter(
             "hsp,cds",
             "WHERE hsp.cds_id = cds.id" +
-            " AND cds.bgc_id in (" + ",".join(map(str, bgc_ids)) + ")" +
-            " AND hsp.hmm_id in (" + ",".join(map(str, hmm_ids)) + ")",
+            " AND cds.bgc_id IN (" +
+            database.temp_ids("bgc_ids", bgc_ids) + ")" +
+            " AND hsp.hmm_id IN (" +
+            database.temp_ids("hmm_ids", hmm_ids) + ")",
             props=["cds.bgc_id", "cds.id", "hsp.hmm_id",
-                   "CAST(bitscore as INTEGER)"],
-            as_tuples=True
+                   "CAST(bitscore as INTEGER)"]
         ):
             if cds_id not in hsps[bgc_id]:
                 hsps[bgc_id][cds_id] = {}
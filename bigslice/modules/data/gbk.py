@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.gbk
+
+Lightweight, line-oriented GenBank reader that only keeps what
+BGC.parse_gbk() needs (record id, antiSMASH structured comment,
+features and their qualifiers), the ORIGIN block is never parsed
+"""
+
+import re
+from typing import Iterator, List, Set, TextIO, Union
+
+
+# see Bio.GenBank.Scanner.GenBankScanner
+_HEADER_WIDTH = 12
+_FEATURE_KEY_INDENT = 5
+_FEATURE_QUALIFIER_INDENT = 21
+_SEQUENCE_HEADERS = ("ORIGIN", "CONTIG", "BASE COUNT", "WGS")
+
+_LOCATION_TOKENS = re.compile(
+    r"complement\(|\(|\)|<?(\d+)(?:(\.\.|\^)>?(\d+))?")
+_STRUCTURED_COMMENT = re.compile(r"([^#]+)-(START|END)##$")
+_STRUCTURED_COMMENT_ROW = re.compile(r"(.+?)\s*::\s*(.*)")
+
+
+class GBKLocation:
+    """(start, end, strand) of a feature, with the same
+    semantics as Bio.SeqFeature locations (0-based, end-exclusive,
+    start/end of compound locations are their min/max)"""
+
+    __slots__ = ("start", "end", "strand")
+
+    def __init__(self, start: int, end: int, strand: int):
+        self.start = start
+        self.end = end
+        self.strand = strand
+
+    @staticmethod
+    def from_string(location: str):
+        """parse a GenBank location string"""
+        starts = []
+        ends = []
+        strands = set()
+        complements = []  # stack of "is this parenthesis a complement("
+        for match in _LOCATION_TOKENS.finditer(location):
+            token = match.group(0)
+            if token == "complement(":
+                complements.append(True)
+            elif token == "(":
+                complements.append(False)
+            elif token == ")":
+                if complements:
+                    complements.pop()
+            else:
+                pos = int(match.group(1))
+                if match.group(2) == "..":
+                    starts.append(pos - 1)
+                    ends.append(int(match.group(3)))
+                elif match.group(2) == "^":
+                    starts.append(pos)
+                    ends.append(pos)
+                else:
+                    starts.append(pos - 1)
+                    ends.append(pos)
+                strands.add(-1 if sum(complements) % 2 else 1)
+        if not starts:
+            return None
+        return GBKLocation(min(starts), max(ends),
+                           strands.pop() if len(strands) == 1 else None)
+
+
+class GBKFeature:
+    """Represents one entry of a GenBank feature table"""
+
+    __slots__ = ("type", "location", "qualifiers")
+
+    def __init__(self, feature_type: str, location: GBKLocation,
+                 qualifiers: dict):
+        self.type = feature_type
+        self.location = location
+        self.qualifiers = qualifiers
+
+    @property
+    def strand(self):
+        return self.location.strand
+
+
+class GBKRecord:
+    """Represents one GenBank record (without the sequence)"""
+
+    def __init__(self, record_id: str, annotations: dict,
+                 features: List[GBKFeature]):
+        self.id = record_id
+        self.annotations = annotations
+        self.features = features
+
+    def __getitem__(self, index: slice):
+        """mimics SeqRecord slicing: only keep features located
+        fully within the slice, with coordinates shifted to it"""
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise ValueError("only contiguous slices are supported")
+        start = index.start or 0
+        stop = index.stop
+        features = []
+        for feature in self.features:
+            loc = feature.location
+            if loc is None or loc.start < start or \
+                    (stop is not None and loc.end > stop):
+                continue
+            features.append(GBKFeature(
+                feature.type,
+                GBKLocation(loc.start - start, loc.end - start, loc.strand),
+                feature.qualifiers))
+        return GBKRecord(self.id, self.annotations, features)
+
+
+def parse(gbk_path: Union[str, TextIO],
+          feature_types: Set[str]=None) -> Iterator[GBKRecord]:
+    """iterate over the records of a GenBank file (path or opened
+    text handle), if feature_types is given, features of any
+    other type are skipped entirely"""
+    if not isinstance(gbk_path, str):
+        yield from parse_handle(gbk_path, feature_types)
+        return
+    with open(gbk_path, "r") as handle:
+        yield from parse_handle(handle, feature_types)
+
+
+def parse_handle(handle, feature_types: Set[str]=None) -> Iterator[GBKRecord]:
+    """see parse(), reads from an opened text handle"""
+
+    record_id = None
+    locus_name = None
+    accession = None
+    structured_comment = {}
+    features = []
+    section = None  # None | "comment" | "features" | "sequence"
+    comment_key = None
+    feature = None  # [type, location string, [(key, value lines)]]
+
+    def flush_feature():
+        if feature is None:
+            return
+        feature_type, location, raw_qualifiers = feature
+        qualifiers = {}
+        for key, lines in raw_qualifiers:
+            if lines is None:  # e.g. /pseudo
+                qualifiers.setdefault(key, [""])
+                continue
+            value = " ".join(lines)
+            if len(value) > 1 and value[0] == '"' and value[-1] == '"':
+                value = value[1:-1]
+            value = value.replace('""', '"')
+            if key == "translation":
+                value = "".join(value.split())
+            qualifiers.setdefault(key, []).append(value)
+        features.append(GBKFeature(
+            feature_type,
+            GBKLocation.from_string("".join(location.split())),
+            qualifiers))
+
+    for line in handle:
+        line = line.rstrip("\n\r")
+
+        if line.startswith("//"):
+            flush_feature()
+            annotations = {}
+            if structured_comment:
+                annotations["structured_comment"] = structured_comment
+            if not record_id:
+                record_id = accession or locus_name
+            yield GBKRecord(record_id, annotations, features)
+            record_id = locus_name = accession = None
+            structured_comment = {}
+            features = []
+            section = None
+            comment_key = None
+            feature = None
+            continue
+
+        if section == "sequence":
+            continue
+
+        if section == "features":
+            if line.startswith(" " * _FEATURE_QUALIFIER_INDENT):
+                if feature is None:
+                    continue
+                data = line[_FEATURE_QUALIFIER_INDENT:]
+                qualifiers = feature[2]
+                if data.startswith("/"):
+                    key, sep, value = data[1:].partition("=")
+                    qualifiers.append((key, [value] if sep else None))
+                elif qualifiers:
+                    if qualifiers[-1][1] is not None:
+                        qualifiers[-1][1].append(data)
+                else:  # multi-line location
+                    feature[1] += data
+                continue
+            elif line.startswith(" " * _FEATURE_KEY_INDENT) and \
+                    line[_FEATURE_KEY_INDENT] != " ":
+                flush_feature()
+                feature_type = line[
+                    _FEATURE_KEY_INDENT:_FEATURE_QUALIFIER_INDENT].strip()
+                if feature_types is None or feature_type in feature_types:
+                    feature = [feature_type,
+                               line[_FEATURE_QUALIFIER_INDENT:], []]
+                else:
+                    feature = None
+                continue
+            else:
+                flush_feature()
+                feature = None
+                section = None
+                if line[:_HEADER_WIDTH].rstrip() in _SEQUENCE_HEADERS or \
+                        line.startswith(_SEQUENCE_HEADERS):
+                    section = "sequence"
+                    continue
+
+        header = line[:_HEADER_WIDTH].rstrip()
+        data = line[_HEADER_WIDTH:].strip()
+        if header == "":
+            if section == "comment":
+                match = _STRUCTURED_COMMENT.search(data)
+                if match:
+                    if match.group(2) == "START":
+                        comment_key = match.group(1)
+                        structured_comment.setdefault(comment_key, {})
+                    else:
+                        comment_key = None
+                elif comment_key is not None:
+                    match = _STRUCTURED_COMMENT_ROW.match(data)
+                    if match:
+                        structured_comment[comment_key][
+                            match.group(1)] = match.group(2)
+            continue
+
+        section = None
+        if header == "LOCUS":
+            locus_name = data.split()[0] if data else None
+        elif header == "ACCESSION":
+            if data and accession is None:
+                accession = data.split()[0]
+        elif header == "VERSION":
+            if data:
+                record_id = data.split()[0]
+        elif header == "COMMENT":
+            section = "comment"
+            match = _STRUCTURED_COMMENT.search(data)
+            if match and match.group(2) == "START":
+                comment_key = match.group(1)
+                structured_comment.setdefault(comment_key, {})
+        elif header == "FEATURES":
+            section = "features"
+        elif header in _SEQUENCE_HEADERS or line.startswith(_SEQUENCE_HEADERS):
+            section = "sequence"
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.gbk_file
+
+Handle manipulation and storing of the per-dataset
+manifest of input gbk files ('gbk_file' table)
+"""
+
+from os import stat_result
+from typing import Dict, List, Tuple
+from .database import Database
+
+
+# BGCs of the deleted entries, i.e. those parsed from input files
+# that have since been modified or removed, they are kept (previous
+# runs still refer to them) but are no longer part of the dataset
+# (e.g. "... AND bgc.id NOT IN (" + SUPERSEDED_BGC_IDS + ")")
+SUPERSEDED_BGC_IDS = (
+    "SELECT gbk_file_bgc.bgc_id FROM gbk_file_bgc, gbk_file"
+    " WHERE gbk_file.id=gbk_file_bgc.gbk_file_id AND gbk_file.deleted=1")
+
+
+class GBKFile:
+    """Represents an input gbk file of a dataset"""
+
+    def __init__(self, properties: dict):
+        self.id = properties.get("id", -1)
+        self.dataset_id = properties["dataset_id"]
+        self.path = properties["path"]
+        self.size = properties["size"]
+        self.mtime = properties["mtime"]
+        self.md5 = properties["md5"]
+        self.deleted = properties.get("deleted", False)
+        self.bgc_ids = properties.get("bgc_ids", [])
+
+    def is_unchanged(self, stat: stat_result):
+        """cheap check (no file reading) whether the file
+        on disk is still the one recorded in the manifest"""
+        return self.size == stat.st_size and self.mtime == stat.st_mtime
+
+    def save(self, database: Database):
+        """commits gbk_file data"""
+        if self.id > -1:
+            raise Exception("not_implemented")
+        else:
+            self.id = database.insert(
+                "gbk_file",
+                {
+                    "dataset_id": self.dataset_id,
+                    "path": self.path,
+                    "size": self.size,
+                    "mtime": self.mtime,
+                    "md5": self.md5,
+                    "deleted": self.deleted
+                }
+            )
+            for bgc_id in self.bgc_ids:
+                database.insert(
+                    "gbk_file_bgc",
+                    {
+                        "gbk_file_id": self.id,
+                        "bgc_id": bgc_id
+                    }
+                )
+
+    @staticmethod
+    def set_deleted(gbk_file_ids: List[int], database: Database):
+        """flag the entries as deleted (i.e. removed from or
+        replaced in the dataset folder), their BGCs are then
+        superseded (see SUPERSEDED_BGC_IDS)"""
+        database.update(
+            "gbk_file",
+            {"deleted": True},
+            "WHERE id IN (" +
+            database.temp_ids("gbk_file_ids", gbk_file_ids) + ")"
+        )
+
+    @staticmethod
+    def set_stats(stats: List[Tuple[int, stat_result]],
+                  database: Database):
+        """update size and mtime of the entries whose content
+        did not change (e.g. the files were only touched),
+        stats: [(gbk_file_id, stat), ...]"""
+        database.update_many(
+            "gbk_file",
+            ["size", "mtime"],
+            [(stat.st_size, stat.st_mtime, gbk_file_id)
+             for gbk_file_id, stat in stats]
+        )
+
+    @staticmethod
+    def load_dataset(dataset_id: int, database: Database):
+        """fetch all non-deleted entries of a dataset,
+        returns a {path: GBKFile} dictionary"""
+        results: Dict[str, GBKFile] = {}
+        by_id = {}
+        for row in database.select(
+            "gbk_file",
+            "WHERE dataset_id=? AND deleted=0",
+            parameters=(dataset_id,)
+        ):
+            gbk_file = GBKFile(row)
+            results[gbk_file.path] = gbk_file
+            by_id[gbk_file.id] = gbk_file
+        for row in database.select(
+            "gbk_file_bgc INNER JOIN gbk_file" +
+            " ON gbk_file.id=gbk_file_bgc.gbk_file_id",
+            "WHERE gbk_file.dataset_id=? AND gbk_file.deleted=0",
+            parameters=(dataset_id,),
+            props=["gbk_file_bgc.gbk_file_id", "gbk_file_bgc.bgc_id"],
+            as_tuples=True
+        ):
+            by_id[row[0]].bgc_ids.append(row[1])
+        return results
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.hit_cache
+
+Persistent cache of the HMM search hits of each sequence, keyed
+by (HMM library, e.g. its md5, md5 of the sequence), kept in its own
+Sqlite3 file so that it can be shared by runs, datasets and output
+folders (a sequence is only ever searched once per library)
+"""
+
+import json
+import sqlite3
+from hashlib import md5
+from typing import Dict, Iterable, List
+
+
+class HitCache:
+    """Sqlite3-backed {(library, sequence md5): hits}, with
+    hits any JSON-serializable list (an empty one for a sequence
+    searched without hits)"""
+
+    def __init__(self, db_path: str, timeout: float=60):
+        self._connection = sqlite3.connect(db_path, timeout=timeout)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS hits ("
+            " library VARCHAR(250) NOT NULL,"
+            " seq_md5 CHAR(32) NOT NULL,"
+            " hits TEXT NOT NULL,"
+            " PRIMARY KEY(library, seq_md5)"
+            ") WITHOUT ROWID")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    @staticmethod
+    def get_key(sequence: str):
+        """the cache key of a sequence"""
+        return md5(sequence.encode("utf-8")).hexdigest()
+
+    def get(self, library: str,
+            seq_md5s: Iterable[str]) -> Dict[str, List]:
+        """{sequence md5: hits} of the cached sequences (looked up
+        at once, joining a TEMP table of the md5s, see temp_ids.py)"""
+        cur = self._connection.cursor()
+        cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS seq_md5s("
+            " seq_md5 CHAR(32) PRIMARY KEY)")
+        cur.execute("DELETE FROM temp.seq_md5s")
+        cur.executemany(
+            "INSERT OR IGNORE INTO temp.seq_md5s(seq_md5) VALUES (?)",
+            ((seq_md5,) for seq_md5 in seq_md5s))
+        results = {
+            seq_md5: json.loads(seq_hits)
+            for seq_md5, seq_hits in cur.execute(
+                "SELECT hits.seq_md5, hits.hits FROM temp.seq_md5s"
+                " INNER JOIN hits ON hits.library=?"
+                " AND hits.seq_md5=temp.seq_md5s.seq_md5", (library,))
+        }
+        # don't keep other processes sharing the file waiting
+        self._connection.commit()
+        return results
+
+    def put(self, library: str, hits: Dict[str, List]):
+        """cache {sequence md5: hits}"""
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO hits(library, seq_md5, hits)"
+            " VALUES (?, ?, ?)",
+            ((library, seq_md5, json.dumps(seq_hits))
+             for seq_md5, seq_hits in hits.items()))
+        self._connection.commit()
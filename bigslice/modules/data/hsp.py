@@ -11,6 +11,7 @@ Handle registration of hmmscan results
 
 from os import path
 from .database import Database
+from .encoding import encode_gaps, find_gaps
 from Bio.SearchIO import parse
 
 
@@ -53,12 +54,12 @@ class HSP:
                         "hsp_id": self.id,
                         "model_start": self.alignment["model_start"],
                         "model_end": self.alignment["model_end"],
-                        "model_gaps": ",".join(
-                            map(str, self.alignment["model_gaps"])),
+                        "model_gaps": encode_gaps(
+                            self.alignment["model_gaps"]),
                         "cds_start": self.alignment["cds_start"],
                         "cds_end": self.alignment["cds_end"],
-                        "cds_gaps": ",".join(
-                            map(str, self.alignment["cds_gaps"]))
+                        "cds_gaps": encode_gaps(
+                            self.alignment["cds_gaps"])
                     }
                 )
 
@@ -109,14 +110,10 @@ class HSP:
                     hsp_alignment = {
                         "model_start": hsp.hit_start,
                         "model_end": hsp.hit_end,
-                        "model_gaps": [i for i, c
-                                       in enumerate(str(hsp.hit.seq))
-                                       if c == '.'],
+                        "model_gaps": find_gaps(str(hsp.hit.seq), '.'),
                         "cds_start": hsp.query_start + locs[0],
                         "cds_end": hsp.query_end + locs[0],
-                        "cds_gaps": [i for i, c
-                                     in enumerate(str(hsp.query.seq))
-                                     if c == '-']
+                        "cds_gaps": find_gaps(str(hsp.query.seq), '-')
                     }
                 else:
                     hsp_alignment = None
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.input_files
+
+Discovery and reading of the input clustergbks (or antiSMASH
+JSON results), either as plain .gbk/.json files, compressed
+.gz/.bz2/.xz files or (compressed) files inside
+.zip/.tar(.gz|.bz2|.xz) archives
+"""
+
+import bz2
+import gzip
+import lzma
+import re
+import tarfile
+import zipfile
+from multiprocessing.pool import ThreadPool
+from os import path, scandir, stat, stat_result
+from time import time
+from typing import Dict, Iterator, Tuple
+
+
+# "gbk": antiSMASH/MIBiG clustergbks,
+# "json": antiSMASH (5 and up) JSON results
+INPUT_FORMATS = ("gbk", "json")
+
+# only take antiSMASH/MIBiG-derived GBKs
+ELIGIBLE_GBK_NAMES = [re.compile(rgx) for rgx in [
+    "^BGC[0-9]{7}$",  # MIBiG
+    "^.+\\.cluster[0-9]+$",  # antiSMASH4 clustergbks
+    "^.+\\.region[0-9]+$",  # antiSMASH5 clustergbks
+]]
+
+_COMPRESSIONS = {
+    ".gz": (gzip.open, gzip.decompress),
+    ".bz2": (bz2.open, bz2.decompress),
+    ".xz": (lzma.open, lzma.decompress)
+}
+
+_ARCHIVES = (".tar.gz", ".tgz", ".tar.bz2", ".tbz2",
+             ".tar.xz", ".txz", ".tar", ".zip")
+
+# folders modified less than this many seconds before being listed
+# are not cached, as entries can still be added within the same
+# mtime tick without changing it
+_RACY_MTIME_WINDOW = 2
+
+
+def _split_compression(file_path: str):
+    """(file_path without the compression extension, extension)"""
+    base, ext = path.splitext(file_path)
+    if ext in _COMPRESSIONS:
+        return base, ext
+    return file_path, ""
+
+
+def is_eligible_gbk(file_path: str):
+    """check if a (possibly compressed) file is
+    an antiSMASH/MIBiG clustergbk, based on its name"""
+    gbk_name, ext = path.splitext(_split_compression(file_path)[0])
+    if ext != ".gbk":
+        return False
+    gbk_name = path.basename(gbk_name)
+    for eligible_pattern in ELIGIBLE_GBK_NAMES:
+        if eligible_pattern.match(gbk_name):
+            return True
+    return False
+
+
+def is_eligible_json(file_path: str):
+    """check if a (possibly compressed) file is
+    a JSON file, based on its name"""
+    return path.splitext(_split_compression(file_path)[0])[1] == ".json"
+
+
+def _is_eligible(file_path: str, input_format: str):
+    if input_format == "gbk":
+        return is_eligible_gbk(file_path)
+    elif input_format == "json":
+        return is_eligible_json(file_path)
+    raise Exception("unknown input format: " + input_format)
+
+
+def get_archive_stem(file_path: str):
+    """file_path without its archive extension,
+    None if it is not a supported archive"""
+    for ext in _ARCHIVES:
+        if file_path.endswith(ext):
+            return file_path[:-len(ext)]
+    return None
+
+
+def get_input_type(file_path: str, input_format: str="gbk"):
+    """input_format for eligible (compressed) clustergbks or JSONs,
+    "archive" for archives, None for anything else"""
+    if _is_eligible(file_path, input_format):
+        return input_format
+    elif get_archive_stem(file_path) is not None:
+        return "archive"
+    return None
+
+
+def get_container_path(input_path: str):
+    """input file containing an entry listed by read_input_file(),
+    i.e. strip the member part of archive entries"""
+    parts = input_path.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if get_archive_stem(part) is not None:
+            return "/".join(parts[:i + 1])
+    return input_path
+
+
+def read_input_file(root: str, rel_path: str,
+                    input_format: str="gbk") -> Iterator[
+        Tuple[str, str, bytes]]:
+    """read (and decompress) the clustergbk(s) or JSON(s) of an
+    input file, yields (input path, file path, content) where:
+    input path: rel_path, or rel_path/member for archive members
+    file path: where the uncompressed file would be if the input
+    file was extracted, i.e. without compression extension
+    and with archive members in a folder named after the archive
+    (both are relative to root)"""
+
+    full_path = path.join(root, rel_path)
+    archive_stem = get_archive_stem(rel_path)
+
+    if archive_stem is None:
+        gbk_path, ext = _split_compression(rel_path)
+        if ext:
+            with _COMPRESSIONS[ext][0](full_path, "rb") as handle:
+                content = handle.read()
+        else:
+            with open(full_path, "rb") as handle:
+                content = handle.read()
+        yield (rel_path, gbk_path, content)
+        return
+
+    def member_entry(member_name: str, content: bytes):
+        member_name = path.normpath(member_name)
+        gbk_path, ext = _split_compression(member_name)
+        if ext:
+            content = _COMPRESSIONS[ext][1](content)
+        return (rel_path + "/" + member_name,
+                path.join(archive_stem, gbk_path),
+                content)
+
+    if rel_path.endswith(".zip"):
+        with zipfile.ZipFile(full_path) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and \
+                        _is_eligible(member.filename, input_format):
+                    yield member_entry(
+                        member.filename, archive.read(member))
+    else:
+        # stream mode: members are decompressed sequentially, once
+        with tarfile.open(full_path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and \
+                        _is_eligible(member.name, input_format):
+                    yield member_entry(
+                        member.name, archive.extractfile(member).read())
+
+
+def _list_folder(root: str, rel_dir: str, cached: tuple, scan_time: float,
+                 input_format: str):
+    """list a single folder, returns (listing, subfolders, files)
+    where files are (name, stat) of the eligible input files and
+    listing is (mtime, subfolders, file names) to be cached (None
+    if the folder is too recently modified to be cached), the
+    cached listing is used instead of reading the folder if its
+    mtime is unchanged"""
+    full_path = path.join(root, rel_dir)
+    dir_mtime = stat(full_path).st_mtime
+    subfolders = []
+    files = []
+    if cached is not None and cached[0] == dir_mtime:
+        subfolders = cached[1]
+        for name in cached[2]:
+            try:
+                files.append((name, stat(path.join(full_path, name))))
+            except FileNotFoundError:
+                pass
+    else:
+        with scandir(full_path) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):  # same as glob
+                    continue
+                if entry.is_dir():
+                    subfolders.append(entry.name)
+                elif get_input_type(entry.name, input_format) and \
+                        entry.is_file():
+                    files.append((entry.name, entry.stat()))
+    if scan_time - dir_mtime > _RACY_MTIME_WINDOW:
+        listing = (dir_mtime, subfolders, [name for name, _ in files])
+    else:
+        listing = None
+    return listing, subfolders, files
+
+
+def _walk_folder(arguments: tuple):
+    """recursively list the eligible input files of a folder, returns
+    (rel_dir, [(rel_path, stat), ...], {folder: listing})
+    (see _list_folder())"""
+    root, rel_dir, cached, scan_time, input_format = arguments
+    results = []
+    listings = {}
+    stack = [rel_dir]
+    while len(stack) > 0:
+        cur_dir = stack.pop()
+        listing, subfolders, files = _list_folder(
+            root, cur_dir, cached.get(cur_dir, None), scan_time,
+            input_format)
+        if listing is not None:
+            listings[cur_dir] = listing
+        results.extend(
+            (path.join(cur_dir, name), file_stat)
+            for name, file_stat in files)
+        stack.extend(path.join(cur_dir, name) for name in subfolders)
+    return rel_dir, results, listings
+
+
+def discover_input_files(root: str, num_threads: int,
+                         cached_listing: Dict[str, dict]=None,
+                         input_format: str="gbk"
+                         ) -> Iterator[Tuple[str, stat_result]]:
+    """list the eligible input files (see get_input_type()) under
+    root, yields (path relative to root, stat) as soon as each of
+    the top-level subfolders is walked (in parallel threads, the
+    walk is mostly waiting on the filesystem),
+    cached_listing: {top-level subfolder: {folder: listing}} from a
+    previous walk, updated in place (see _list_folder()), folders
+    whose mtime did not change are not read again"""
+    if cached_listing is None:
+        cached_listing = {}
+    scan_time = time()
+    listing, subfolders, files = _list_folder(
+        root, "", cached_listing.get("", {}).get("", None), scan_time,
+        input_format)
+    cached_listing[""] = {"": listing} if listing is not None else {}
+    for name, file_stat in files:
+        yield (name, file_stat)
+    for name in list(cached_listing.keys()):
+        if name != "" and name not in subfolders:
+            del cached_listing[name]
+    if len(subfolders) < 1:
+        return
+    with ThreadPool(max(1, min(num_threads, len(subfolders)))) as pool:
+        for name, results, listings in pool.imap_unordered(
+                _walk_folder, [
+                    (root, name, cached_listing.get(name, {}), scan_time,
+                     input_format)
+                    for name in subfolders]):
+            cached_listing[name] = listings
+            yield from results
@@ -60,11 +60,13 @@ class Run:
         if self.id < 0:
             raise Exception("Run entry is not set")
 
-        bgcs_not_processed = len(self.database.select(
+        bgcs_not_processed = self.database.select(
             "run_bgc_status",
             "WHERE run_id=? AND status<?",
-            parameters=(self.id, status)
-        ))
+            parameters=(self.id, status),
+            props=["count(bgc_id)"],
+            as_tuples=True
+        )[0][0]
         if bgcs_not_processed > 0:
             raise Exception("failed to update run status, " +
                             str(bgcs_not_processed) +
@@ -125,12 +127,13 @@ class Run:
                 "WHERE id=?",
                 parameters=(run_id,)
             )[0]
-            bgcs = {bgc_row["bgc_id"]: bgc_row["status"]
-                    for bgc_row in database.select(
-                "run_bgc_status",
-                "WHERE run_id=? ORDER BY bgc_id ASC",
-                parameters=(run_row["id"],)
-            )}
+            bgcs = {bgc_id: status
+                    for bgc_id, status in database.select_iter(
+                        "run_bgc_status",
+                        "WHERE run_id=? ORDER BY bgc_id ASC",
+                        parameters=(run_row["id"],),
+                        props=["bgc_id", "status"]
+                    )}
             properties = {
                 "id": run_row["id"],
                 "prog_params": run_row["prog_params"],
@@ -154,12 +157,13 @@ class Run:
                 " ORDER BY id DESC",
                 parameters=(hmm_db_id, min_status)
             )[0]
-            bgcs = {bgc_row["bgc_id"]: bgc_row["status"]
-                    for bgc_row in database.select(
-                "run_bgc_status",
-                "WHERE run_id=? ORDER BY bgc_id ASC",
-                parameters=(run_row["id"],)
-            )}
+            bgcs = {bgc_id: status
+                    for bgc_id, status in database.select_iter(
+                        "run_bgc_status",
+                        "WHERE run_id=? ORDER BY bgc_id ASC",
+                        parameters=(run_row["id"],),
+                        props=["bgc_id", "status"]
+                    )}
             properties = {
                 "id": run_row["id"],
                 "prog_params": run_row["prog_params"],
@@ -1,10 +1,10 @@
 -- SQLite3 schema for storage and manipulation of bigslice data
 
--- schema ver.: 1.0.1
+-- schema ver.: 1.1.0
 CREATE TABLE IF NOT EXISTS schema (
     ver VARCHAR(10) PRIMARY KEY
 );
-INSERT OR IGNORE INTO schema VALUES('1.0.1');
+INSERT OR IGNORE INTO schema VALUES('1.1.0');
 
 -- dataset
 CREATE TABLE IF NOT EXISTS dataset (
@@ -26,7 +26,6 @@ CREATE TABLE IF NOT EXISTS bgc (
     length_nt INTEGER NOT NULL,
     orig_folder VARCHAR(1500) NOT NULL,
     orig_filename VARCHAR(1500) NOT NULL,
-    UNIQUE(orig_folder, orig_filename, dataset_id),
     FOREIGN KEY(dataset_id) REFERENCES dataset(id),
     FOREIGN KEY(type) REFERENCES enum_bgc_type(code)
 );
@@ -38,6 +37,34 @@ CREATE INDEX IF NOT EXISTS bgc_filename ON bgc(orig_filename);
 CREATE INDEX IF NOT EXISTS bgc_contigedge ON bgc(on_contig_edge);
 CREATE INDEX IF NOT EXISTS bgc_length ON bgc(length_nt);
 
+-- gbk_file (manifest of the dataset's input files)
+-- deleted: the file has been removed from the dataset folder,
+-- or replaced by a newer version (i.e. another gbk_file entry),
+-- its BGCs (see gbk_file_bgc) are then superseded: kept for the
+-- previous runs, but left out of the dataset's (see
+-- gbk_file.SUPERSEDED_BGC_IDS)
+CREATE TABLE IF NOT EXISTS gbk_file (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dataset_id INTEGER NOT NULL,
+    path VARCHAR(3000) NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    md5 CHAR(32) NOT NULL,
+    deleted BOOLEAN NOT NULL DEFAULT 0,
+    FOREIGN KEY(dataset_id) REFERENCES dataset(id)
+);
+CREATE INDEX IF NOT EXISTS gbkfile_path ON gbk_file(dataset_id, deleted, path);
+
+-- gbk_file_bgc
+CREATE TABLE IF NOT EXISTS gbk_file_bgc (
+    gbk_file_id INTEGER NOT NULL,
+    bgc_id INTEGER NOT NULL,
+    UNIQUE(gbk_file_id, bgc_id),
+    FOREIGN KEY(gbk_file_id) REFERENCES gbk_file(id),
+    FOREIGN KEY(bgc_id) REFERENCES bgc(id)
+);
+CREATE INDEX IF NOT EXISTS gbkfilebgc_bgc ON gbk_file_bgc(bgc_id);
+
 -- enum_bgc_type
 CREATE TABLE IF NOT EXISTS enum_bgc_type (
     code VARCHAR(10) PRIMARY KEY,
@@ -57,10 +84,21 @@ CREATE TABLE IF NOT EXISTS cds (
     locus_tag VARCHAR(100),
     protein_id VARCHAR(100),
     product VARCHAR(100),
-    aa_seq TEXT NOT NULL,
-    FOREIGN KEY(bgc_id) REFERENCES bgc(id)
+    aa_seq_id INTEGER NOT NULL,
+    FOREIGN KEY(bgc_id) REFERENCES bgc(id),
+    FOREIGN KEY(aa_seq_id) REFERENCES protein(id)
 );
 CREATE INDEX IF NOT EXISTS cds_bgc ON cds(bgc_id,nt_start,nt_end);
+CREATE INDEX IF NOT EXISTS cds_aaseq ON cds(aa_seq_id);
+
+-- protein (unique CDS translations, shared by
+-- all CDSes having the exact same aa_seq,
+-- zlib-compressed, see encoding.py)
+CREATE TABLE IF NOT EXISTS protein (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    md5 CHAR(32) NOT NULL UNIQUE,
+    aa_seq BLOB NOT NULL
+);
 
 -- hmm_db
 CREATE TABLE IF NOT EXISTS hmm_db (
@@ -102,15 +140,16 @@ CREATE TABLE IF NOT EXISTS hsp (
 CREATE INDEX IF NOT EXISTS hsp_cdshmm ON hsp(cds_id, hmm_id);
 CREATE INDEX IF NOT EXISTS hsp_bitscore ON hsp(bitscore);
 
--- hsp_alignment
+-- hsp_alignment (gaps: delta/varint-encoded
+-- positions, see encoding.py)
 CREATE TABLE IF NOT EXISTS hsp_alignment (
     hsp_id INTEGER UNIQUE NOT NULL,
     model_start INTEGER NOT NULL,
     model_end INTEGER NOT NULL,
-    model_gaps TEXT NOT NULL,
+    model_gaps BLOB NOT NULL,
     cds_start INTEGER NOT NULL,
     cds_end INTEGER NOT NULL,
-    cds_gaps TEXT NOT NULL,
+    cds_gaps BLOB NOT NULL,
     FOREIGN KEY(hsp_id) REFERENCES hsp(id)
 );
 CREATE INDEX IF NOT EXISTS hspalign_id ON hsp_alignment(hsp_id);
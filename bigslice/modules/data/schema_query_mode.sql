@@ -1,11 +1,11 @@
 -- SQLite3 schema for the query results
 
--- query_schema ver.: 1.0.1, parent schema ver.: 1.0.1
+-- query_schema ver.: 1.1.0, parent schema ver.: 1.1.0
 CREATE TABLE IF NOT EXISTS schema (
     ver VARCHAR(10) PRIMARY KEY,
     parent_schema_ver VARCHAR(10)
 );
-INSERT OR IGNORE INTO schema VALUES('1.0.1', '1.0.1');
+INSERT OR IGNORE INTO schema VALUES('1.1.0', '1.1.0');
 
 -- bgc
 CREATE TABLE IF NOT EXISTS bgc (
@@ -35,10 +35,21 @@ CREATE TABLE IF NOT EXISTS cds (
     locus_tag VARCHAR(100),
     protein_id VARCHAR(100),
     product VARCHAR(100),
-    aa_seq TEXT NOT NULL,
-    FOREIGN KEY(bgc_id) REFERENCES bgc(id)
+    aa_seq_id INTEGER NOT NULL,
+    FOREIGN KEY(bgc_id) REFERENCES bgc(id),
+    FOREIGN KEY(aa_seq_id) REFERENCES protein(id)
 );
 CREATE INDEX IF NOT EXISTS cds_bgc ON cds(bgc_id,nt_start,nt_end);
+CREATE INDEX IF NOT EXISTS cds_aaseq ON cds(aa_seq_id);
+
+-- protein (unique CDS translations, shared by
+-- all CDSes having the exact same aa_seq,
+-- zlib-compressed, see encoding.py)
+CREATE TABLE IF NOT EXISTS protein (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    md5 CHAR(32) NOT NULL UNIQUE,
+    aa_seq BLOB NOT NULL
+);
 
 -- bgc_class
 CREATE TABLE IF NOT EXISTS bgc_class (
@@ -61,15 +72,16 @@ CREATE TABLE IF NOT EXISTS hsp (
 CREATE INDEX IF NOT EXISTS hsp_cdshmm ON hsp(cds_id, hmm_id);
 CREATE INDEX IF NOT EXISTS hsp_bitscore ON hsp(bitscore);
 
--- hsp_alignment
+-- hsp_alignment (gaps: delta/varint-encoded
+-- positions, see encoding.py)
 CREATE TABLE IF NOT EXISTS hsp_alignment (
     hsp_id INTEGER UNIQUE NOT NULL,
     model_start INTEGER NOT NULL,
     model_end INTEGER NOT NULL,
-    model_gaps TEXT NOT NULL,
+    model_gaps BLOB NOT NULL,
     cds_start INTEGER NOT NULL,
     cds_end INTEGER NOT NULL,
-    cds_gaps TEXT NOT NULL,
+    cds_gaps BLOB NOT NULL,
     FOREIGN KEY(hsp_id) REFERENCES hsp(id)
 );
 CREATE INDEX IF NOT EXISTS hspalign_id ON hsp_alignment(hsp_id);
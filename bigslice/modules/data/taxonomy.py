@@ -10,7 +10,9 @@ Handle manipulation and storing of bgc taxonomy
 """
 
 from .database import Database
+from bisect import bisect_left
 from os import path
+from typing import Dict, Iterable, List, Set, Tuple
 
 
 class Taxonomy:
@@ -39,10 +41,12 @@ class Taxonomy:
             Taxonomy._CODE_ORGANISM: properties.get("Organism", "")
         }
 
-    def save(self, database: Database):
-        """commits taxonomy data"""
+    def save(self, database: Database, only_bgc_ids: Set[int]=None):
+        """commits taxonomy data
+        only_bgc_ids: if given, only assign taxonomy to these BGCs"""
 
         # add/query taxonomy entries
+        database.declare_pending_index("taxon", ["name", "level"])
         tax_ids = []
         for level, name in self.taxonomy.items():
             if len(name) > 0:
@@ -84,6 +88,8 @@ class Taxonomy:
             ),
             props=["id"]
         ):
+            if only_bgc_ids is not None and bgc["id"] not in only_bgc_ids:
+                continue
             bgc_ids.append(bgc["id"])
             for tax_id in tax_ids:
                 database.insert(
@@ -95,3 +101,98 @@ class Taxonomy:
                 )
 
         return bgc_ids
+
+    @staticmethod
+    def save_all(taxonomies: Iterable["Taxonomy"], database: Database,
+                 only_bgc_ids: Set[int]=None):
+        """bulk version of save(), for whole taxonomy files:
+        taxon and BGC paths are loaded once and matched in memory
+        (with the same case-insensitive matching as the LIKE
+        queries in save()), returns the assigned bgc ids"""
+
+        # existing taxa
+        taxon_ids: Dict[Tuple[int, str], int] = {}
+        for tax_id, level, name in database.select(
+            "taxon",
+            "WHERE 1 ORDER BY id",
+            props=["id", "level", "name"],
+            as_tuples=True
+        ):
+            taxon_ids.setdefault((level, name.lower()), tax_id)
+
+        bgc_indexes: Dict[int, _BGCPathIndex] = {}
+        bgc_ids = []
+        for taxonomy in taxonomies:
+
+            # add/query taxonomy entries
+            tax_ids = []
+            for level, name in taxonomy.taxonomy.items():
+                if len(name) > 0:
+                    key = (level, name.lower())
+                    if key not in taxon_ids:
+                        taxon_ids[key] = database.insert(
+                            "taxon",
+                            {
+                                "level": level,
+                                "name": name
+                            }
+                        )
+                    tax_ids.append(taxon_ids[key])
+
+            # insert bgc_taxonomy
+            if taxonomy.dataset_id not in bgc_indexes:
+                bgc_indexes[taxonomy.dataset_id] = _BGCPathIndex(
+                    database.select(
+                        "bgc",
+                        "WHERE dataset_id=?",
+                        parameters=(taxonomy.dataset_id,),
+                        props=["id", "orig_folder", "orig_filename"],
+                        as_tuples=True
+                    ), only_bgc_ids)
+            for bgc_id in bgc_indexes[taxonomy.dataset_id].find(
+                    taxonomy.path_startswith):
+                bgc_ids.append(bgc_id)
+                for tax_id in tax_ids:
+                    database.insert(
+                        "bgc_taxonomy",
+                        {
+                            "bgc_id": bgc_id,
+                            "taxon_id": tax_id
+                        }
+                    )
+
+        return bgc_ids
+
+
+class _BGCPathIndex:
+    """BGCs of a dataset, grouped by (lowercased) orig_folder
+    and sorted by (lowercased) orig_filename, for matching
+    the taxonomy path_startswith"""
+
+    def __init__(self, rows: Iterable[Tuple[int, str, str]],
+                 only_bgc_ids: Set[int]=None):
+        folders: Dict[str, List[Tuple[str, int]]] = {}
+        for bgc_id, orig_folder, orig_filename in rows:
+            if only_bgc_ids is not None and bgc_id not in only_bgc_ids:
+                continue
+            folders.setdefault(orig_folder.lower(), []).append(
+                (orig_filename.lower(), bgc_id))
+        self._filenames = {}
+        self._bgc_ids = {}
+        for folder, entries in folders.items():
+            entries.sort()
+            self._filenames[folder] = [entry[0] for entry in entries]
+            self._bgc_ids[folder] = [entry[1] for entry in entries]
+
+    def find(self, path_startswith: str):
+        """ids of BGCs in path_startswith's folder whose
+        filename starts with its basename"""
+        folder = path.dirname(path_startswith).lower()
+        prefix = path.basename(path_startswith).lower()
+        filenames = self._filenames.get(folder, [])
+        results = []
+        for i in range(bisect_left(filenames, prefix), len(filenames)):
+            if not filenames[i].startswith(prefix):
+                break
+            results.append(self._bgc_ids[folder][i])
+        return results
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.temp_ids
+
+Id sets as TEMP tables, to be joined against in place of
+"IN (1,2,3,...)" lists: the SQL stays the same whatever (and
+however many) ids are queried, so that sqlite3 can reuse its
+prepared statements
+
+(only depends on sqlite3, also copied into the output
+folder's flask app, see utils.copy_output_template())
+"""
+
+import sqlite3
+from typing import Iterable
+
+
+def load_temp_ids(connection: sqlite3.Connection, name: str,
+                  ids: Iterable[int]):
+    """(re)fill the TEMP table <name> of the connection with the ids,
+    returns "SELECT id FROM temp.<name>" to use as "... IN (...)",
+    e.g. "WHERE bgc_id IN (" + load_temp_ids(con, "bgc_ids", ids) + ")"
+    (a table stays valid until its name is loaded again)"""
+    cur = connection.cursor()
+    cur.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS {}(id INTEGER PRIMARY KEY)".format(
+            name))
+    cur.execute("DELETE FROM temp.{}".format(name))
+    cur.executemany(
+        "INSERT OR IGNORE INTO temp.{}(id) VALUES (?)".format(name),
+        ((int(id_),) for id_ in ids))
+    return "SELECT id FROM temp.{}".format(name)
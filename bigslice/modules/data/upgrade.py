@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (C) 2019 Satria A. Kautsar
+# Wageningen University & Research
+# Bioinformatics Group
+"""bigslice.modules.data.upgrade
+
+Upgrade the database files made by an older version of
+bigslice (schema 1.0.1) to the current schema
+"""
+
+from contextlib import closing
+from hashlib import md5
+from os import path, remove, stat
+from shutil import move
+import re
+import sqlite3
+from .encoding import compress_aa_seq, encode_gaps
+
+# (parent) schema versions that upgrade_database() can upgrade from
+UPGRADABLE_SCHEMA_VERS = ["1.0.1"]
+
+
+def read_schema(for_query_mode: bool=False):
+    """returns (the current schema version, the sql of
+    schema.sql or schema_query_mode.sql)"""
+    schema_folder = path.dirname(path.abspath(__file__))
+    sql_schema = open(path.join(schema_folder, "schema.sql"), "r").read()
+    schema_ver = re.search(
+        r"\n-- schema ver\.: (?P<ver>\d+\.\d+\.\d+)", sql_schema).group("ver")
+    if for_query_mode:
+        sql_schema = open(path.join(
+            schema_folder, "schema_query_mode.sql"), "r").read()
+    return schema_ver, sql_schema
+
+
+def upgrade_database(db_path: str, for_query_mode: bool=False,
+                     input_folder: str=None):
+    """upgrade a database file of an older schema version (of a
+    query mode report: of an older parent schema version), the
+    rows are copied into a new file with the current schema, which
+    then replaces it (the original file is kept as
+    <db_path>.<its schema version>), input_folder: see
+    _add_gbk_files(), returns False if it is already up to date"""
+
+    schema_ver, sql_schema = read_schema(for_query_mode)
+    with closing(sqlite3.connect(db_path)) as connection:
+        db_schema_ver = connection.execute(
+            "SELECT parent_schema_ver FROM schema" if for_query_mode
+            else "SELECT ver FROM schema").fetchone()[0]
+    if db_schema_ver == schema_ver:
+        return False
+    if db_schema_ver not in UPGRADABLE_SCHEMA_VERS:
+        raise Exception(
+            "can't upgrade {} from schema version {}".format(
+                db_path, db_schema_ver))
+
+    upgraded_db_path = db_path + ".upgrade"
+    if path.exists(upgraded_db_path):
+        remove(upgraded_db_path)
+    with closing(sqlite3.connect(upgraded_db_path)) as connection:
+        connection.executescript(sql_schema)
+        connection.execute("ATTACH DATABASE ? AS old", (db_path,))
+        connection.create_function(
+            "md5", 1, lambda text: md5(text.encode("utf-8")).hexdigest())
+        connection.create_function("compress_aa_seq", 1, compress_aa_seq)
+        connection.create_function(
+            "encode_gaps", 1,
+            lambda text: encode_gaps([int(i) for i in text.split(",") if i]))
+        _copy_tables(connection)
+        _copy_cds(connection)
+        _copy_hsp_alignment(connection)
+        if not for_query_mode:
+            _add_gbk_files(connection, input_folder)
+        connection.commit()
+        connection.execute("DETACH DATABASE old")
+    move(db_path, db_path + "." + db_schema_ver)
+    move(upgraded_db_path, db_path)
+    return True
+
+
+def _get_columns(connection: sqlite3.Connection, schema: str, table: str):
+    """names of the columns of a table of the (attached) database"""
+    return [row[1] for row in connection.execute(
+        "PRAGMA {}.table_info({})".format(schema, table))]
+
+
+def _copy_tables(connection: sqlite3.Connection):
+    """copy the rows of the tables of the attached 'old' database
+    into the same tables of the new one (only the columns that both
+    have, so that the rows can take the defaults of the new ones),
+    along with the last AUTOINCREMENT ids, tables that changed their
+    layout are copied by their own functions"""
+    old_tables = set(row[0] for row in connection.execute(
+        "SELECT name FROM old.sqlite_master WHERE type='table'"))
+    for table, in connection.execute(
+            "SELECT name FROM main.sqlite_master WHERE type='table'"
+            " AND name NOT IN ('schema', 'sqlite_sequence', 'cds',"
+            " 'hsp_alignment')"
+            ).fetchall():
+        if table not in old_tables:
+            continue
+        old_columns = set(_get_columns(connection, "old", table))
+        columns = ",".join(
+            column for column in _get_columns(connection, "main", table)
+            if column in old_columns)
+        connection.execute(
+            "INSERT OR IGNORE INTO main.{0} ({1})"
+            " SELECT {1} FROM old.{0} ORDER BY rowid".format(
+                table, columns))
+    connection.execute("DELETE FROM main.sqlite_sequence")
+    connection.execute(
+        "INSERT INTO main.sqlite_sequence"
+        " SELECT name, seq FROM old.sqlite_sequence")
+
+
+def _copy_cds(connection: sqlite3.Connection):
+    """copy the cds rows, moving their aa_seq into the (deduplicated)
+    protein table (see bgc.py), compressed (see encoding.py)"""
+    connection.execute(
+        "INSERT OR IGNORE INTO main.protein(md5, aa_seq)"
+        " SELECT md5(aa_seq), compress_aa_seq(aa_seq) FROM old.cds"
+        " ORDER BY id")
+    connection.execute(
+        "INSERT INTO main.cds(id, bgc_id, nt_start, nt_end, strand,"
+        " locus_tag, protein_id, product, aa_seq_id)"
+        " SELECT old.cds.id, bgc_id, nt_start, nt_end, strand,"
+        " locus_tag, protein_id, product, main.protein.id"
+        " FROM old.cds INNER JOIN main.protein"
+        " ON main.protein.md5=md5(old.cds.aa_seq)"
+        " ORDER BY old.cds.id")
+
+
+def _copy_hsp_alignment(connection: sqlite3.Connection):
+    """copy the hsp_alignment rows, re-encoding their comma-joined
+    gap positions as BLOBs (see encoding.py)"""
+    connection.execute(
+        "INSERT INTO main.hsp_alignment(hsp_id, model_start, model_end,"
+        " model_gaps, cds_start, cds_end, cds_gaps)"
+        " SELECT hsp_id, model_start, model_end, encode_gaps(model_gaps),"
+        " cds_start, cds_end, encode_gaps(cds_gaps)"
+        " FROM old.hsp_alignment ORDER BY rowid")
+
+
+def _add_gbk_files(connection: sqlite3.Connection, input_folder: str=None):
+    """fill the manifest of each dataset (see gbk_file.py) with an
+    entry per input gbk its BGCs were parsed from, input_folder: the
+    input folder of the database's datasets, to take the size, mtime
+    and md5 of the gbks found there, otherwise (or for the gbks not
+    found) those are left empty, i.e. the next run that processes
+    the dataset will re-parse the gbks once"""
+    for dataset_id, dataset_folder in connection.execute(
+            "SELECT id, orig_folder FROM dataset ORDER BY id").fetchall():
+        # gbk path (as in the manifest): [bgc_id, ...]
+        gbk_bgc_ids = {}
+        for bgc_id, orig_folder, orig_filename in connection.execute(
+                "SELECT id, orig_folder, orig_filename FROM bgc"
+                " WHERE dataset_id=? ORDER BY id", (dataset_id,)):
+            gbk_bgc_ids.setdefault(
+                path.join(orig_folder, orig_filename), []).append(bgc_id)
+        for gbk_path, bgc_ids in gbk_bgc_ids.items():
+            gbk_size, gbk_mtime, gbk_md5 = -1, -1, ""
+            if input_folder is not None:
+                gbk_full_path = path.join(
+                    input_folder, dataset_folder, gbk_path)
+                if path.exists(gbk_full_path):
+                    gbk_stat = stat(gbk_full_path)
+                    gbk_size = gbk_stat.st_size
+                    gbk_mtime = gbk_stat.st_mtime
+                    hasher = md5()
+                    with open(gbk_full_path, "rb") as handle:
+                        for block in iter(lambda: handle.read(2**20), b""):
+                            hasher.update(block)
+                    gbk_md5 = hasher.hexdigest()
+            gbk_file_id = connection.execute(
+                "INSERT INTO gbk_file(dataset_id, path, size, mtime, md5)"
+                " VALUES(?, ?, ?, ?, ?)",
+                (dataset_id, gbk_path, gbk_size, gbk_mtime, gbk_md5)
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO gbk_file_bgc(gbk_file_id, bgc_id) VALUES(?, ?)",
+                [(gbk_file_id, bgc_id) for bgc_id in bgc_ids])
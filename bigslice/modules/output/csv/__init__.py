@@ -2,18 +2,23 @@ import sqlite3
 import pandas as pd
 import numpy as np
 from os import path, makedirs
+from ...data.gbk_file import SUPERSEDED_BGC_IDS
 
 
 def export_bgc_metadata(result_folder, csv_path, sep=","):
     with sqlite3.connect(path.join(result_folder, "result/data.db")) as con:
         cur = con.cursor()        
-        bgc_ids = [row[0] for row in cur.execute("select id from bgc order by id asc").fetchall()]
+        # (without the BGCs of modified or removed input files)
+        bgc_ids = [row[0] for row in cur.execute(
+            "select id from bgc where id not in (" + SUPERSEDED_BGC_IDS + ")"
+            " order by id asc").fetchall()]
 
         print("loading clustergbk metadata..")
         dataset_names, folder_paths, file_names, contig_edges, length_nts = list(zip(*cur.execute(
             "select dataset.name, bgc.orig_folder, bgc.orig_filename, bgc.on_contig_edge, bgc.length_nt"
             " from bgc,dataset"
             " where bgc.dataset_id=dataset.id"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
             " order by bgc.id"
         ).fetchall()))
 
@@ -99,7 +104,10 @@ def export_run_metadata(result_folder, csv_path, sep=","):
 def export_gcf_membership(result_folder, csv_path, sep=","):
     with sqlite3.connect(path.join(result_folder, "result/data.db")) as con:
         cur = con.cursor()        
-        bgc_ids = [row[0] for row in cur.execute("select id from bgc order by id asc").fetchall()]
+        # (without the BGCs of modified or removed input files)
+        bgc_ids = [row[0] for row in cur.execute(
+            "select id from bgc where id not in (" + SUPERSEDED_BGC_IDS + ")"
+            " order by id asc").fetchall()]
 
         df = pd.read_sql((
             "select bgc_id, gcf.id_in_run, run_id from gcf"
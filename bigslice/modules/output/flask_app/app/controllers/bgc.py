@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import sqlite3
+import zlib
 from flask import render_template, request, redirect
 from flask import abort
 import json
@@ -363,10 +364,11 @@ def get_genes_table():
         result["data"] = []
         for cds_id, start, end, strand, locus_tag, \
                 protein_id, product, aa_seq in cur.execute((
-                    "select id, nt_start, nt_end, strand,"
+                    "select cds.id, nt_start, nt_end, strand,"
                     " locus_tag, protein_id, product, aa_seq"
-                    " from cds"
+                    " from cds, protein"
                     " where bgc_id=?"
+                    " and protein.id=cds.aa_seq_id"
                     " order by nt_start asc"
                     " limit ? offset ?"
                 ), (bgc_id, limit, offset)).fetchall():
@@ -384,7 +386,7 @@ def get_genes_table():
             # product
             data["product"] = product or "n/a"
             data["locus"] = (start, end, strand)
-            data["aa_seq"] = aa_seq
+            data["aa_seq"] = zlib.decompress(aa_seq).decode("utf-8")
 
             # domain information
             data["domains"] = []
@@ -12,6 +12,12 @@ from ..config import conf
 from flask import Blueprint
 blueprint = Blueprint('dataset', __name__)
 
+# BGCs of input files that have since been modified or removed
+# from their dataset folder (see the 'gbk_file' table)
+SUPERSEDED_BGC_IDS = (
+    "select gbk_file_bgc.bgc_id from gbk_file_bgc, gbk_file"
+    " where gbk_file.id=gbk_file_bgc.gbk_file_id and gbk_file.deleted=1")
+
 
 @blueprint.route("/dataset/<int:dataset_id>")
 def page_dataset(dataset_id):
@@ -66,6 +72,7 @@ def get_bgc_table():
             "select count(id)"
             " from bgc"
             " where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
         ).format("=" if dataset_id > 0 else "!="),
             (dataset_id,)).fetchall()[0][0]
 
@@ -74,6 +81,7 @@ def get_bgc_table():
             "select count(id)"
             " from bgc"
             " where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
         ).format("=" if dataset_id > 0 else "!="),
             (dataset_id,)).fetchall()[0][0]
 
@@ -93,6 +101,7 @@ def get_bgc_table():
             ",length_nt,on_contig_edge"
             " from bgc"
             " where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
             " limit ? offset ?"
         ).format("=" if dataset_id > 0 else "!="),
                 (dataset_id, limit, offset)).fetchall():
@@ -166,6 +175,7 @@ def get_stats():
             "select count(id)"
             " from bgc"
             " where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
         ).format("=" if dataset_id > 0 else "!="),
             (dataset_id,)).fetchall()[0][0]
 
@@ -174,6 +184,7 @@ def get_stats():
             "select count(distinct orig_folder)"
             " from bgc"
             " where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
             " and orig_folder not like ''"
         ).format("=" if dataset_id > 0 else "!="),
             (dataset_id,)).fetchall()[0][0]
@@ -183,6 +194,7 @@ def get_stats():
             "select count(id)"
             " from bgc"
             " where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
             " and orig_folder not like ''"
         ).format("=" if dataset_id > 0 else "!="),
             (dataset_id,)).fetchall()[0][0]
@@ -192,6 +204,7 @@ def get_stats():
             "select count(distinct bgc_id)"
             " from bgc, bgc_taxonomy"
             " where bgc.dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
             " and bgc.id=bgc_taxonomy.bgc_id"
         ).format("=" if dataset_id > 0 else "!="),
             (dataset_id,)).fetchall()[0][0]
@@ -217,6 +230,7 @@ def get_class_counts():
                 "select bgc_id"
                 " from bgc, bgc_class, chem_subclass"
                 " where bgc.dataset_id{}?"
+                " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
                 " and bgc.id=bgc_class.bgc_id"
                 " and chem_subclass.id=bgc_class.chem_subclass_id"
                 " group by bgc_id"
@@ -231,6 +245,7 @@ def get_class_counts():
             "select count(distinct bgc_id) from (select bgc_id"
             " from bgc, bgc_class"
             " where bgc.dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
             " and bgc.id=bgc_class.bgc_id"
             " group by bgc_id"
             " having count(chem_subclass_id) > 1"
@@ -243,6 +258,7 @@ def get_class_counts():
             "select count(distinct id)"
             " from bgc"
             " where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
         ).format("=" if dataset_id > 0 else "!="),
             (dataset_id, )).fetchall()[0][0]
         result["n/a"] = bgc_count - sum(result.values())
@@ -272,6 +288,7 @@ def get_bgclength_hist():
         min_nt, max_nt = cur.execute((
             "select min(length_nt), max(length_nt)"
             " from bgc where dataset_id{}?"
+            " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
         ).format("=" if dataset_id > 0 else "!="), (dataset_id, )
         ).fetchall()[0]
 
@@ -289,6 +306,7 @@ def get_bgclength_hist():
                     "select count(id)"
                     " from bgc"
                     " where dataset_id{}?"
+                    " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
                     " and length_nt >= ?"
                     " and length_nt <= ?"
                     " and on_contig_edge == 0"
@@ -303,6 +321,7 @@ def get_bgclength_hist():
                     "select count(id)"
                     " from bgc"
                     " where dataset_id{}?"
+                    " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
                     " and length_nt >= ?"
                     " and length_nt <= ?"
                     " and on_contig_edge == 1"
@@ -317,6 +336,7 @@ def get_bgclength_hist():
                     "select count(id)"
                     " from bgc"
                     " where dataset_id{}?"
+                    " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
                     " and length_nt >= ?"
                     " and length_nt <= ?"
                     " and on_contig_edge is NULL"
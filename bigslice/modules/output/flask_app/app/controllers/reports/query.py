@@ -3,10 +3,12 @@
 from os import path
 import math
 import sqlite3
+import zlib
 from flask import render_template, request
 
 # import global config
 from ...config import conf
+from ...temp_ids import load_temp_ids
 
 def page_report_detail(report_id):
 
@@ -173,7 +175,7 @@ def detail_get_overview():
                 ), (bgc_id, )).fetchall()[0][0]
 
                 # fetch class information
-                subclass_ids = [str(row[0]) for row in cur_query.execute((
+                subclass_ids = [row[0] for row in cur_query.execute((
                     "select distinct chem_subclass_id"
                     " from bgc_class"
                     " where bgc_id=?"
@@ -183,7 +185,8 @@ def detail_get_overview():
                     " from chem_subclass, chem_class"
                     " where chem_subclass.class_id=chem_class.id"
                     " and chem_subclass.id in ({})".format(
-                        ",".join(subclass_ids))
+                        load_temp_ids(
+                            con_source, "subclass_ids", subclass_ids))
                 )).fetchall()
 
     return result
@@ -349,7 +352,7 @@ def detail_get_word_cloud():
                 " from subpfam"
                 " where hmm_id in ({})"
             ).format(
-                ",".join(map(str, bitscores.keys()))
+                load_temp_ids(con_source, "hmm_ids", bitscores.keys())
             )).fetchall():
                 weights[subpfam_id] = sum(bitscores[subpfam_id])
             for hmm_id in bitscores:
@@ -364,7 +367,7 @@ def detail_get_word_cloud():
                     "select id, name from hmm"
                     " where id in ({})"
                 ).format(
-                    ",".join(map(str, weights.keys()))
+                    load_temp_ids(con_source, "hmm_ids", weights.keys())
                 )).fetchall()
             }
 
@@ -417,10 +420,11 @@ def detail_get_genes_table():
             result["data"] = []
             for cds_id, start, end, strand, locus_tag, \
                     protein_id, product, aa_seq in cur_query.execute((
-                        "select id, nt_start, nt_end, strand,"
+                        "select cds.id, nt_start, nt_end, strand,"
                         " locus_tag, protein_id, product, aa_seq"
-                        " from cds"
+                        " from cds, protein"
                         " where bgc_id=?"
+                        " and protein.id=cds.aa_seq_id"
                         " order by nt_start asc"
                         " limit ? offset ?"
                     ), (bgc_id, limit, offset)).fetchall():
@@ -438,7 +442,7 @@ def detail_get_genes_table():
                 # product
                 data["product"] = product or "n/a"
                 data["locus"] = (start, end, strand)
-                data["aa_seq"] = aa_seq
+                data["aa_seq"] = zlib.decompress(aa_seq).decode("utf-8")
 
                 # domain information
                 data["domains"] = []
@@ -691,6 +695,10 @@ def detail_get_homologous_bgcs():
                     " and value >= 255"
                 ), (bgc_id,)).fetchall()]
 
+            # load both id sets for the queries below
+            gcf_ids_sql = load_temp_ids(con_source, "gcf_ids", gcf_ids)
+            hmm_ids_sql = load_temp_ids(con_source, "hmm_ids", hmm_ids)
+
             # fetch bgc features (all)
             features = {
                 hmm_id: value for hmm_id, value in cur_query.execute((
@@ -713,8 +721,8 @@ def detail_get_homologous_bgcs():
                 " and bgc_features.hmm_id"
                 " in ({})"
             ).format(
-                ",".join(map(str, gcf_ids)),
-                ",".join(map(str, hmm_ids))
+                gcf_ids_sql,
+                hmm_ids_sql
             ), (threshold,)).fetchall()[0][0]
 
             # fetch total records (filtered)
@@ -730,8 +738,8 @@ def detail_get_homologous_bgcs():
                 " and bgc_features.hmm_id"
                 " in ({})"
             ).format(
-                ",".join(map(str, gcf_ids)),
-                ",".join(map(str, hmm_ids))
+                gcf_ids_sql,
+                hmm_ids_sql
             ), (threshold,)).fetchall()[0][0]
 
             # fetch bgc_name, dataset_name
@@ -785,8 +793,8 @@ def detail_get_homologous_bgcs():
                     " order by counts desc"
                     " limit ? offset ?"
             ).format(
-                ",".join(map(str, gcf_ids)),
-                ",".join(map(str, hmm_ids))
+                gcf_ids_sql,
+                hmm_ids_sql
             ),
                     (threshold, threshold, limit, offset)).fetchall():
 
@@ -1009,7 +1017,7 @@ def get_bgc_table():
                     comp = "n/a"
 
                 # fetch class information
-                subclass_ids = [str(row[0]) for row in cur.execute((
+                subclass_ids = [row[0] for row in cur.execute((
                     "select distinct chem_subclass_id"
                     " from bgc_class"
                     " where bgc_id=?"
@@ -1019,7 +1027,8 @@ def get_bgc_table():
                     " from chem_subclass, chem_class"
                     " where chem_subclass.class_id=chem_class.id"
                     " and chem_subclass.id in ({})".format(
-                        ",".join(subclass_ids))
+                        load_temp_ids(
+                            con_source, "subclass_ids", subclass_ids))
                 )).fetchall()
 
                 # fetch gcf information
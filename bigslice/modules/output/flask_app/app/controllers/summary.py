@@ -5,6 +5,7 @@ import sqlite3
 
 # import global config
 from ..config import conf
+from .dataset import SUPERSEDED_BGC_IDS
 
 # set blueprint object
 from flask import Blueprint
@@ -51,6 +52,7 @@ def fetch_datasets_summary(db_path):
                 ("select count(distinct orig_folder)"
                     " from bgc"
                     " where dataset_id=?"
+                    " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"
                     " and orig_folder <> ''"),
                 (ds_id, )
             ).fetchall()[0][0]
@@ -58,7 +60,8 @@ def fetch_datasets_summary(db_path):
             bgc_count = cur.execute(
                 ("select count(id)"
                     " from bgc"
-                    " where dataset_id=?"),
+                    " where dataset_id=?"
+                    " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"),
                 (ds_id, )
             ).fetchall()[0][0]
             # fetch bgc with taxonomy counts
@@ -66,7 +69,8 @@ def fetch_datasets_summary(db_path):
                 ("select count(distinct bgc_id)"
                     " from bgc,bgc_taxonomy"
                     " where bgc.id=bgc_taxonomy.bgc_id"
-                    " and bgc.dataset_id=?"),
+                    " and bgc.dataset_id=?"
+                    " and bgc.id not in (" + SUPERSEDED_BGC_IDS + ")"),
                 (ds_id, )
             ).fetchall()[0][0]
             datasets.append({
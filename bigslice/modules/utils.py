@@ -15,7 +15,12 @@ from os import path
 import shutil
 import pickle
 from hashlib import md5
-from typing import List
+from collections import deque
+from heapq import heappop, heappush
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.pool import Pool
+from threading import BoundedSemaphore
+from typing import Callable, Dict, Iterable, List
 
 
 def reversed_fp_iter(fp, buf_size=8192):
@@ -72,6 +77,104 @@ def get_chunk(list_of_ids: List, num_threads, chunk_size: int=100, spread_input:
         i += 1
 
 
+def get_balanced_chunk(list_of_ids: List, weights: Dict, num_threads,
+                       chunk_size: int=100, spread_input: bool=True):
+    """like get_chunk() (same number of chunks), but the chunks are
+    balanced by the total weight (e.g. the number of residues) of
+    their ids instead of by count, each id weighing at least 1,
+    the heaviest chunks come first; the chunks (ids sorted) only
+    depend on the ids and their weights, not on their order
+    """
+    ids = sorted(set(list_of_ids),
+                 key=lambda id_: (-weights.get(id_, 0), id_))
+    divided_equally = int(len(ids) / num_threads)
+    if chunk_size > divided_equally and spread_input:
+        chunk_size = divided_equally
+    chunk_size = max(1, chunk_size)
+    num_chunks = -(-len(ids) // chunk_size)
+    # heaviest ids first, each into the lightest chunk so far
+    chunks = [[] for _ in range(num_chunks)]
+    chunk_weights = [(0, i) for i in range(num_chunks)]
+    for id_ in ids:
+        chunk_weight, i = heappop(chunk_weights)
+        chunks[i].append(id_)
+        heappush(chunk_weights,
+                 (chunk_weight + max(1, weights.get(id_, 0)), i))
+    for chunk_weight, i in sorted(chunk_weights,
+                                  key=lambda x: (-x[0], min(chunks[x[1]]))):
+        chunk = sorted(chunks[i])
+        chunk_name = md5(",".join(
+            map(str, chunk)).encode('utf-8')).hexdigest()
+        yield (chunk, chunk_name)
+
+
+def imap_unordered_bounded(pool: Pool, func: Callable,
+                           iterable: Iterable, max_pending: int):
+    """pool.imap_unordered, but with at most max_pending tasks
+    submitted and not yet consumed by the caller at any time
+    (i.e. results never pile up in the parent process when the
+    consumer is slower than the workers)
+    """
+    slots = BoundedSemaphore(max(1, max_pending))
+    stopped = False
+
+    def throttled():
+        for item in iterable:
+            slots.acquire()
+            if stopped:
+                return
+            yield item
+
+    try:
+        for result in pool.imap_unordered(func, throttled()):
+            yield result
+            slots.release()
+    finally:
+        # unblock the pool's task feeder if the caller stops early
+        stopped = True
+        try:
+            while True:
+                slots.release()
+        except ValueError:
+            pass
+
+
+def imap_pipelined(func: Callable, iterable: Iterable,
+                   max_pending: int=2, pool: Pool=None):
+    """map(func, iterable) with func run in the background, in a
+    worker thread (or in the processes of pool), while the caller
+    handles the previous results, at most max_pending items are
+    submitted and not yet consumed at any time, results are in order
+    the iterable itself is consumed in the caller's thread (i.e.
+    it can read from the caller's sqlite3 connection)
+    exceptions raised by func are re-raised in the caller
+    """
+    # futures (or pool AsyncResults), in the order of the items
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=1) if pool is None else None
+
+    def get_result(task):
+        return task.result() if pool is None else task.get()
+
+    try:
+        for item in iterable:
+            if pool is None:
+                pending.append(executor.submit(func, item))
+            else:
+                pending.append(pool.apply_async(func, (item,)))
+            if len(pending) > max(0, max_pending - 1):
+                yield get_result(pending.popleft())
+        while len(pending) > 0:
+            yield get_result(pending.popleft())
+    finally:
+        if executor is not None:
+            # don't start the remaining items if the caller stops early
+            # (shutdown(cancel_futures=True) needs python 3.9)
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+
 def store_pickle(stored_object: object, pickle_path: str):
     """ save pickle """
     with open(pickle_path, "wb") as fp:
@@ -96,6 +199,12 @@ def copy_output_template(output_folder):
         path.join(template_dir, "app"),
         path.join(output_folder, "app")
     )
+    # the app's controllers share the TEMP id tables helper
+    shutil.copy(
+        path.join(path.dirname(path.realpath(__file__)),
+                  "data", "temp_ids.py"),
+        path.join(output_folder, "app", "temp_ids.py")
+    )
     shutil.copy(
         path.join(template_dir, "start_server.sh"),
         path.join(output_folder, "start_server.sh")
@@ -0,0 +1,88 @@
+"""
+Compare the insert throughput of Database.commit_inserts() (grouped
+executemany) against the previous one-execute-per-row implementation,
+using hsp/hsp_alignment rows like those of the biosyn_pfam scan
+"""
+
+from os import path
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import time
+from bigslice.modules.data.database import Database
+from bigslice.modules.data.encoding import encode_gaps
+
+
+def commit_inserts_per_row(database: Database):
+    """the previous Database.commit_inserts()"""
+    db_cur = database._connection.cursor()
+    for table, data, _ in database._insert_queues:
+        keys = []
+        values = []
+        for key, value in data.items():
+            if key == "id":  # can't have this around!
+                raise Exception("Don't specify id for INSERTs!")
+            keys.append(key)
+            values.append(value)
+        sql = "INSERT INTO {}({}) VALUES ({})".format(
+            table,
+            ",".join(keys),
+            ",".join(["?" for i in range(len(values))])
+        )
+        db_cur.execute(sql, tuple(values))
+    database._connection.commit()
+    database._insert_queues = []
+    database._insert_queues_index = {}
+
+
+def queue_rows(database: Database, num_hsps: int):
+    for i in range(num_hsps):
+        hsp_id = database.insert(
+            "hsp",
+            {
+                "cds_id": i // 4 + 1,
+                "hmm_id": i % 100 + 1,
+                "bitscore": 100.0 + i % 50
+            }
+        )
+        database.insert(
+            "hsp_alignment",
+            {
+                "hsp_id": hsp_id,
+                "model_start": 0,
+                "model_end": 150,
+                "model_gaps": encode_gaps([12, 13]),
+                "cds_start": 20,
+                "cds_end": 170,
+                "cds_gaps": encode_gaps([])
+            }
+        )
+
+
+def main():
+    num_hsps = int(argv[1]) if len(argv) > 1 else 200000
+    num_batches = 10
+
+    with TemporaryDirectory() as tmpdir:
+        for name, commit in [
+            ("per-row execute", commit_inserts_per_row),
+            ("grouped executemany", Database.commit_inserts)
+        ]:
+            database = Database(path.join(
+                tmpdir, "{}.db".format(name.split(" ")[0])))
+            elapsed = 0
+            for _ in range(num_batches):
+                queue_rows(database, num_hsps // num_batches)
+                start = time()
+                commit(database)
+                elapsed += time() - start
+            num_rows = database.select(
+                "hsp", "WHERE 1", props=["count(id) as num"])[0]["num"]
+            database.close()
+            print("{}: {} hsps (+alignments) in {:.3f}s ({:.0f} rows/s)".format(
+                name, num_rows, elapsed, 2 * num_rows / max(elapsed, 1e-9)))
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
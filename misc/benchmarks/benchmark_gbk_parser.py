@@ -0,0 +1,78 @@
+"""
+Compare the "fast" GenBank parser backend of BGC.parse_gbk()
+against the Bio.SeqIO-based one: checks that both produce the
+same BGC/CDS objects, then reports the parsing time of each
+"""
+
+import glob
+from os import path
+from sys import argv
+from time import time
+from bigslice.modules.data.bgc import BGC
+
+
+BGC_PROPS = ["name", "type", "on_contig_edge", "length_nt",
+             "orig_folder", "orig_filename", "chem_subclasses"]
+CDS_PROPS = ["nt_start", "nt_end", "strand", "locus_tag",
+             "protein_id", "product", "aa_seq"]
+
+
+def compare(gbk_path, bgcs_a, bgcs_b):
+    errors = []
+    if len(bgcs_a) != len(bgcs_b):
+        errors.append("number of BGCs: {} vs {}".format(
+            len(bgcs_a), len(bgcs_b)))
+        return errors
+    for bgc_a, bgc_b in zip(bgcs_a, bgcs_b):
+        for prop in BGC_PROPS:
+            if getattr(bgc_a, prop) != getattr(bgc_b, prop):
+                errors.append("{}: {} vs {}".format(
+                    prop, getattr(bgc_a, prop), getattr(bgc_b, prop)))
+        if len(bgc_a.cds) != len(bgc_b.cds):
+            errors.append("number of CDS: {} vs {}".format(
+                len(bgc_a.cds), len(bgc_b.cds)))
+            continue
+        for i, (cds_a, cds_b) in enumerate(zip(bgc_a.cds, bgc_b.cds)):
+            for prop in CDS_PROPS:
+                if getattr(cds_a, prop) != getattr(cds_b, prop):
+                    errors.append("cds#{} {}: {} vs {}".format(
+                        i, prop, getattr(cds_a, prop),
+                        getattr(cds_b, prop)))
+    return errors
+
+
+def main():
+    try:
+        input_folder = argv[1]
+    except IndexError:
+        print("usage: python benchmark_gbk_parser.py <folder_with_gbks>")
+        return 1
+
+    gbk_paths = sorted(glob.iglob(
+        path.join(input_folder, "**/*.gbk"), recursive=True))
+    print("found {} GBKs".format(len(gbk_paths)))
+
+    results = {}
+    for backend in ["biopython", "fast"]:
+        start = time()
+        results[backend] = [BGC.parse_gbk(gbk_path, backend=backend)
+                            for gbk_path in gbk_paths]
+        elapsed = time() - start
+        print("{}: {:.3f}s ({:.1f} GBKs/s)".format(
+            backend, elapsed, len(gbk_paths) / max(elapsed, 1e-9)))
+
+    num_mismatches = 0
+    for gbk_path, bgcs_a, bgcs_b in zip(
+            gbk_paths, results["biopython"], results["fast"]):
+        errors = compare(gbk_path, bgcs_a, bgcs_b)
+        if errors:
+            num_mismatches += 1
+            print("MISMATCH {}:\n  {}".format(gbk_path, "\n  ".join(errors)))
+    print("{} of {} GBKs have mismatching results".format(
+        num_mismatches, len(gbk_paths)))
+
+    return 1 if num_mismatches > 0 else 0
+
+
+if __name__ == "__main__":
+    exit(main())
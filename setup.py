@@ -25,7 +25,7 @@ setuptools.setup(
     ],
     python_requires='>=3.7',
     install_requires=[
-        "pyhmmer",
+        "pyhmmer>=0.8",
         "biopython>=1.73,<=1.83",
         "numpy",
         "pandas",